@@ -1,16 +1,60 @@
 # -*- coding: utf-8 -*-
 import sys
 import re
-import six
 import asyncio
+import hashlib
+import inspect
+import functools
+import concurrent.futures
+import contextvars
+import logging
 
-from aiotgram import apihelper, types, util
+from aiotgram import apihelper, file_cache, process, types, util, webhook
+from aiotgram.broadcast import broadcast, BroadcastCheckpoint
+from aiotgram.dispatch import HandlerList, UpdateDeduplicator
+from aiotgram.lanes import ChatLanes
+from aiotgram.workers import HandlerPool
+from aiotgram.process import ApiCall, MessageSlice
 
 from aiotgram.handler_backends import MemoryHandlerBackend, FileHandlerBackend
+from aiotgram.session import RequestSession
+from aiotgram.ratelimit import RateLimiter
+from aiotgram.file_cache import MemoryFileIdCache, DiskFileIdCache
+from aiotgram.metrics import MetricsSink, PrometheusMetrics
+from aiotgram.read_cache import ReadCache
 
 
 __version__ = '0.1.0'
 
+# Service messages after which cached getChat, getChatMember and getChatAdministrators results are outdated.
+_CHAT_CHANGING_CONTENT_TYPES = {
+    'new_chat_members', 'left_chat_member', 'new_chat_title', 'new_chat_photo', 'delete_chat_photo',
+    'pinned_message', 'migrate_to_chat_id', 'migrate_from_chat_id'
+}
+
+# Kinds of updates, the key of the kind in the update JSON: (type, handler list, process method).
+_UPDATE_KINDS = {
+    'message': (types.Message, 'message_handlers', 'process_new_messages'),
+    'edited_message': (types.Message, 'edited_message_handlers', 'process_new_edited_messages'),
+    'channel_post': (types.Message, 'channel_post_handlers', 'process_new_channel_posts'),
+    'edited_channel_post': (types.Message, 'edited_channel_post_handlers', 'process_new_edited_channel_posts'),
+    'inline_query': (types.InlineQuery, 'inline_handlers', 'process_new_inline_query'),
+    'chosen_inline_result': (types.ChosenInlineResult, 'chosen_inline_handlers', 'process_new_chosen_inline_query'),
+    'callback_query': (types.CallbackQuery, 'callback_query_handlers', 'process_new_callback_query'),
+    'shipping_query': (types.ShippingQuery, 'shipping_query_handlers', 'process_new_shipping_query'),
+    'pre_checkout_query': (types.PreCheckoutQuery, 'pre_checkout_query_handlers', 'process_new_pre_checkout_query'),
+    'poll': (types.Poll, 'poll_handlers', 'process_new_poll'),
+    'poll_answer': (types.PollAnswer, 'poll_answer_handlers', 'process_new_poll_answer'),
+}
+
+# Values of the executor option of handlers.
+_EXECUTORS = (None, 'thread', 'process')
+
+# Handler calls of the update dispatched by a coroutine middleware, they are awaited by its call_next.
+_middleware_calls = contextvars.ContextVar('middleware_calls', default=None)
+
+logger = logging.getLogger('AioTGram')
+
 
 class AioTGram:
     """
@@ -22,12 +66,49 @@ class AioTGram:
     """
 
     def __init__(self, token, parse_mode=None,
-                 next_step_backend=None, reply_backend=None):
+                 next_step_backend=None, reply_backend=None, session=None, file_id_cache=None, lanes=None,
+                 handler_pool=None, thread_pool=None, process_pool=None):
+        """
+        :param token: Bot token
+        :param parse_mode: Default parse mode
+        :param next_step_backend: Backend for next step handlers, MemoryHandlerBackend by default
+        :param reply_backend: Backend for reply handlers, MemoryHandlerBackend by default
+        :param session: RequestSession with connection pool settings, a new one with defaults is created if not passed,
+            a passed session is not closed by close
+        :param file_id_cache: Optional FileIdCache, files found in it are sent by file_id instead of being uploaded
+        :param lanes: 'chat' or 'user' to run handlers of one chat or user one after another, see ChatLanes
+        :param handler_pool: HandlerPool limiting concurrent handlers, a new one without limits is created if not passed
+        :param thread_pool: concurrent.futures.ThreadPoolExecutor for sync handlers and blocking filters,
+            the default executor of the loop is used if not passed
+        :param process_pool: concurrent.futures.ProcessPoolExecutor for handlers with executor='process',
+            a new one is created on first use if not passed
+        """
         self.token = token
         self.parse_mode = parse_mode
         self.update_listener = []
 
+        self.session = session
+        self._own_session = not self.session
+        if self._own_session:
+            self.session = RequestSession()
+        apihelper.register_session(self.token, self.session)
+
+        self.file_id_cache = file_id_cache
+
+        self.lanes = ChatLanes(lanes) if lanes else None
+
+        self.handler_pool = handler_pool
+        if self.handler_pool is None:
+            self.handler_pool = HandlerPool()
+
+        self.thread_pool = thread_pool
+        self.process_pool = process_pool
+        self._own_process_pool = False
+
         self.last_update_id = 0
+        # Drops updates delivered twice, None disables it.
+        self.deduplicator = UpdateDeduplicator()
+        self._polling = False
 
         self.next_step_backend = next_step_backend
         if not self.next_step_backend:
@@ -37,17 +118,21 @@ class AioTGram:
         if not self.reply_backend:
             self.reply_backend = MemoryHandlerBackend()
 
-        self.message_handlers = []
-        self.edited_message_handlers = []
-        self.channel_post_handlers = []
-        self.edited_channel_post_handlers = []
-        self.inline_handlers = []
-        self.chosen_inline_handlers = []
-        self.callback_query_handlers = []
-        self.shipping_query_handlers = []
-        self.pre_checkout_query_handlers = []
-        self.poll_handlers = []
-        self.poll_answer_handlers = []
+        self.message_handlers = HandlerList()
+        self.edited_message_handlers = HandlerList()
+        self.channel_post_handlers = HandlerList()
+        self.edited_channel_post_handlers = HandlerList()
+        self.inline_handlers = HandlerList()
+        self.chosen_inline_handlers = HandlerList()
+        self.callback_query_handlers = HandlerList()
+        self.shipping_query_handlers = HandlerList()
+        self.pre_checkout_query_handlers = HandlerList()
+        self.poll_handlers = HandlerList()
+        self.poll_answer_handlers = HandlerList()
+
+        self.middlewares = []
+        # Middlewares compiled into one callable, None while there are none.
+        self._process_update = None
 
     def enable_save_next_step_handlers(self, delay=120, filename='./.handler-saves/step.save'):
         """
@@ -79,19 +164,321 @@ class AioTGram:
         """
         self.next_step_backend.load_handlers(filename, del_file_after_loading)
 
-    async def set_webhook(self, url):
-        await apihelper.set_webhook(self.token, url)
+    async def close(self):
+        """
+        Closes the connection pool of the bot if the bot created it and file_id_cache. Must be called on shutdown.
+        """
+        apihelper.unregister_session(self.token)
+        if self._own_session:
+            await self.session.close()
+
+        if self.file_id_cache:
+            await self.file_id_cache.close()
+
+        if self._own_process_pool:
+            self.process_pool.shutdown(wait=False)
+            self.process_pool = None
+            self._own_process_pool = False
+
+    async def get_updates(self, offset=None, limit=None, timeout=20, allowed_updates=None):
+        """
+        Use this method to receive incoming updates using long polling.
+        :param offset: Identifier of the first update to be returned
+        :param limit: Limits the number of updates to be retrieved, values between 1-100 are accepted
+        :param timeout: Timeout in seconds for long polling
+        :param allowed_updates: List of update types the bot should receive
+        :return: list of Update
+        """
+        result = await apihelper.get_updates(self.token, offset, limit, timeout, allowed_updates)
+        return [types.Update.de_json(update) for update in result]
+
+    async def polling(self, limit=100, timeout=20, allowed_updates=None, error_interval=3):
+        """
+        Receives updates with long polling and processes them until stop_polling is called.
+
+        The request for the next batch is sent before the current batch is processed, so waiting
+        for the network and handling of updates overlap. Updates are confirmed by this request,
+        therefore a batch which was being processed when the process died is not received again.
+        The webhook must be deleted before polling.
+
+        :param limit: Maximum number of updates in one batch, values between 1-100 are accepted
+        :param timeout: Timeout in seconds for long polling
+        :param allowed_updates: List of update types the bot should receive, derived from handlers if not passed
+        :param error_interval: Delay in seconds after a failed request
+        """
+        self._polling = True
+        fetch = None
+
+        try:
+            while self._polling:
+                if fetch is None:
+                    fetch = self._request_updates(limit, timeout, allowed_updates)
+
+                try:
+                    updates = await fetch
+                except Exception:
+                    # CancelledError is not an Exception, stopping the task still ends polling.
+                    logger.exception('Failed to receive updates')
+                    fetch = None
+                    await asyncio.sleep(error_interval)
+                    continue
+
+                fetch = None
+                if not updates:
+                    continue
+
+                # The next batch is not requested while the handler pool is full.
+                await self.handler_pool.wait_for_space()
+
+                self.last_update_id = max(self.last_update_id, updates[-1]['update_id'])
+                fetch = self._request_updates(limit, timeout, allowed_updates)
+
+                try:
+                    self.process_raw_updates(updates)
+                except Exception:
+                    # The batch is already confirmed by the next request, a failing filter or middleware
+                    # must not stop polling.
+                    logger.exception('Failed to process updates')
+        finally:
+            if fetch is not None:
+                fetch.cancel()
+
+    def stop_polling(self):
+        self._polling = False
+
+    def _request_updates(self, limit, timeout, allowed_updates):
+        # Handlers may be added while polling, so allowed updates are derived for every request.
+        if allowed_updates is None:
+            allowed_updates = self.get_allowed_updates()
+
+        return asyncio.create_task(apihelper.get_updates(
+            self.token, self.last_update_id + 1, limit, timeout, allowed_updates))
+
+    async def get_me(self):
+        """
+        Returns basic information about the bot.
+        :return: User
+        """
+        return types.User.de_json(await apihelper.get_me(self.token))
+
+    async def get_chat(self, chat_id):
+        """
+        Use this method to get up to date information about the chat.
+        :param chat_id: Unique identifier for the target chat
+        :return: Chat
+        """
+        return types.Chat.de_json(await apihelper.get_chat(self.token, chat_id))
+
+    async def get_chat_administrators(self, chat_id):
+        """
+        Use this method to get a list of administrators in a chat.
+        :param chat_id: Unique identifier for the target chat
+        :return: list of ChatMember
+        """
+        result = await apihelper.get_chat_administrators(self.token, chat_id)
+        return [types.ChatMember.de_json(member) for member in result]
+
+    async def get_chat_member(self, chat_id, user_id):
+        """
+        Use this method to get information about a member of a chat.
+
+        Results of get_chat, get_chat_member and get_chat_administrators are cached if the bot's
+        RequestSession has read_cache, they are dropped when a service message about members or
+        other changes of the chat arrives.
+
+        :param chat_id: Unique identifier for the target chat
+        :param user_id: Unique identifier of the target user
+        :return: ChatMember
+        """
+        return types.ChatMember.de_json(await apihelper.get_chat_member(self.token, chat_id, user_id))
+
+    async def get_file(self, file_id):
+        """
+        Use this method to get basic info about a file and prepare it for downloading.
+        :param file_id: File identifier
+        :return: File
+        """
+        return types.File.de_json(await apihelper.get_file(self.token, file_id))
+
+    async def download_file(self, file_id, dest):
+        """
+        Downloads file to dest in chunks without keeping it in memory.
+        A partially downloaded dest is resumed. The number of simultaneous downloads is limited
+        by max_downloads of the bot's RequestSession.
+        :param file_id: File identifier
+        :param dest: Path of the destination file
+        :return: dest
+        """
+        file = await self.get_file(file_id)
+        return await apihelper.download_file(self.token, file.file_path, dest)
+
+    async def set_webhook(self, url, max_connections=None, allowed_updates=None):
+        """
+        Use this method to specify a url and receive incoming updates via an outgoing webhook.
+        :param url: HTTPS url to send updates to
+        :param max_connections: Maximum allowed number of simultaneous HTTPS connections to the webhook, 1-100
+        :param allowed_updates: List of update types the bot should receive, derived from handlers if not passed
+        """
+        if allowed_updates is None:
+            allowed_updates = self.get_allowed_updates()
+
+        await apihelper.set_webhook(self.token, url, max_connections, allowed_updates)
 
     async def delete_webhook(self):
         await apihelper.delete_webhook(self.token)
 
     async def send_message(self, chat_id, text, reply_markup=None):
-        await apihelper.send_message(self.token, chat_id, text, reply_markup)
+        """
+        Use this method to send text messages.
+        :param chat_id: Unique identifier for the target chat
+        :param text: Text of the message
+        :param reply_markup: Optional markup
+        :return: Message, None if the message was sent in the webhook response
+        """
+        result = await apihelper.send_message(self.token, chat_id, text, reply_markup)
+        return types.Message.de_json(result['result'])
+
+    async def answer_callback_query(self, callback_query_id, text=None, show_alert=None, url=None, cache_time=None):
+        """
+        Use this method to send answers to callback queries sent from inline keyboards.
+        :param callback_query_id: Unique identifier for the query to be answered
+        :param text: Text of the notification
+        :param show_alert: If true, an alert will be shown instead of a notification at the top of the chat screen
+        :param url: URL that will be opened by the user's client
+        :param cache_time: Seconds the result of the callback query may be cached client-side
+        :return: True
+        """
+        await apihelper.answer_callback_query(self.token, callback_query_id, text, show_alert, url, cache_time)
+        return True
+
+    async def send_photo(self, chat_id, photo, caption=None, reply_markup=None, parse_mode=None):
+        """
+        Use this method to send photos.
+        :param chat_id: Unique identifier for the target chat
+        :param photo: file_id or URL string, os.PathLike, file object or async iterator of bytes
+        :param caption: Photo caption
+        :param reply_markup: Optional markup
+        :param parse_mode: Parse mode of the caption, bot's parse_mode is used if not passed
+        :return: Message
+        """
+        parse_mode = self.parse_mode if parse_mode is None else parse_mode
+        return await self._send_file(apihelper.send_photo, 'photo', chat_id, photo, caption, reply_markup, parse_mode)
+
+    async def send_document(self, chat_id, document, caption=None, reply_markup=None, parse_mode=None):
+        """
+        Use this method to send general files.
+        Files given as os.PathLike, file object or async iterator are streamed without loading them in memory.
+        :param chat_id: Unique identifier for the target chat
+        :param document: file_id or URL string, os.PathLike, file object or async iterator of bytes
+        :param caption: Document caption
+        :param reply_markup: Optional markup
+        :param parse_mode: Parse mode of the caption, bot's parse_mode is used if not passed
+        :return: Message
+        """
+        parse_mode = self.parse_mode if parse_mode is None else parse_mode
+        return await self._send_file(apihelper.send_document, 'document', chat_id, document, caption, reply_markup,
+                                     parse_mode)
+
+    async def send_video(self, chat_id, video, duration=None, caption=None, reply_markup=None, parse_mode=None,
+                         supports_streaming=None):
+        """
+        Use this method to send video files.
+        :param chat_id: Unique identifier for the target chat
+        :param video: file_id or URL string, os.PathLike, file object or async iterator of bytes
+        :param duration: Duration of the video in seconds
+        :param caption: Video caption
+        :param reply_markup: Optional markup
+        :param parse_mode: Parse mode of the caption, bot's parse_mode is used if not passed
+        :param supports_streaming: Pass True, if the uploaded video is suitable for streaming
+        :return: Message
+        """
+        parse_mode = self.parse_mode if parse_mode is None else parse_mode
+        return await self._send_file(apihelper.send_video, 'video', chat_id, video, duration, caption, reply_markup,
+                                     parse_mode, supports_streaming)
+
+    async def send_media_group(self, chat_id, media, disable_notification=None, reply_to_message_id=None):
+        """
+        Use this method to send a group of photos or videos as an album.
+        :param chat_id: Unique identifier for the target chat
+        :param media: List of InputMedia, their media can be given the same way as in send_document
+        :param disable_notification: Sends the messages silently
+        :param reply_to_message_id: If the messages are a reply, ID of the original message
+        :return: list of Message
+        """
+        # Keys of files which are uploaded now and have to be cached.
+        uploads = []
+        for input_media in media:
+            key, file_id = await self._find_cached_file(input_media.media, input_media.type)
+            if file_id:
+                input_media.set_media(file_id)
+                key = None
+            uploads.append(key)
+
+        result = await apihelper.send_media_group(self.token, chat_id, media, disable_notification,
+                                                  reply_to_message_id)
+        messages = [types.Message.de_json(message) for message in result['result']]
+
+        for key, message in zip(uploads, messages):
+            if key:
+                await self.file_id_cache.set(key, file_cache.get_file_id(message))
+
+        return messages
+
+    async def _send_file(self, send, data_type, chat_id, data, *args):
+        key, file_id = await self._find_cached_file(data, data_type)
+        if file_id:
+            data = file_id
+
+        result = await send(self.token, chat_id, data, *args)
+        message = types.Message.de_json(result['result'])
+
+        if key and not file_id:
+            await self.file_id_cache.set(key, file_cache.get_file_id(message))
+
+        return message
+
+    async def _find_cached_file(self, data, data_type):
+        """
+        Looks up data in file_id_cache.
+        :param data: File to send
+        :param data_type: Media type the file is sent as, e.g. 'photo' or 'document'
+        :return: cache key of data (None if it can not be cached) and file_id if the file was uploaded before
+        """
+        if not self.file_id_cache or util.is_string(data):
+            return None, None
+
+        key = await file_cache.make_key(data, data_type)
+        if key is None:
+            return None, None
+
+        return key, await self.file_id_cache.get(key)
+
+    def broadcast(self, chat_ids, text, reply_markup=None, concurrency=20, checkpoint=None):
+        """
+        Sends one message to many chats.
+
+        Example:
+
+        checkpoint = BroadcastCheckpoint('./.handler-saves/announcement.save')
+        async for result in bot.broadcast(chat_ids, 'Hello!', checkpoint=checkpoint):
+            if not result.ok:
+                logger.warning('%s: %s', result.chat_id, result.error)
+
+        Pass RequestSession(rate_limiter=RateLimiter()) to the bot to keep the broadcast within the API quotas.
+
+        :param chat_ids: Iterable of chat ids
+        :param text: Text of the message
+        :param reply_markup: Optional markup
+        :param concurrency: Maximum number of requests in flight
+        :param checkpoint: Optional BroadcastCheckpoint, recipients saved in it are skipped
+        :return: async iterator of BroadcastResult in order of completion
+        """
+        return broadcast(self, chat_ids, text, reply_markup, concurrency, checkpoint)
 
     async def send_notification(self, chat_id, text, reply_markup=None):
         await apihelper.send_notification(self.token, chat_id, text, reply_markup)
 
-    def message_handler(self, commands=None, regexp=None, func=None, content_types=None, **kwargs):
+    def message_handler(self, commands=None, regexp=None, func=None, content_types=None, executor=None, **kwargs):
         """
         Message handler decorator.
         This decorator can be used to decorate functions that must handle certain types of messages.
@@ -121,13 +508,20 @@ class AioTGram:
         :param regexp: Optional regular expression.
         :param func: Optional lambda function. The lambda receives the message to test as the first parameter. It must return True if the command should handle the message.
         :param content_types: This commands' supported content types. Must be a list. Defaults to ['text'].
+        :param executor: 'thread' to call func and the handler in the thread pool, for blocking I/O.
+            Handlers which are not coroutine functions always run in the thread pool.
+            'process' to call the handler in the process pool, for CPU-bound work, see aiotgram.process.
         """
         if content_types is None:
             content_types = ['text']
 
+        if executor not in _EXECUTORS:
+            raise ValueError('executor must be one of {0}, not {1!r}'.format(_EXECUTORS, executor))
+
         def decorator(handler):
             handler_dict = self._build_handler_dict(
                 handler,
+                executor=executor,
                 commands=commands,
                 regexp=regexp,
                 func=func,
@@ -140,6 +534,95 @@ class AioTGram:
 
         return decorator
 
+    def middleware_handler(self):
+        """
+        Middleware decorator, see add_middleware.
+
+        Example:
+
+        @bot.middleware_handler()
+        def shed_load(update, call_next):
+            if bot.handler_pool.queue_depth < 1000:
+                call_next(update)
+
+        @bot.middleware_handler()
+        async def check_user(update, call_next):
+            if update.message is None or await is_allowed(update.message.from_user.id):
+                await call_next(update)
+        """
+        def decorator(middleware):
+            self.add_middleware(middleware)
+
+            return middleware
+
+        return decorator
+
+    def add_middleware(self, middleware):
+        """
+        Adds a middleware called for every update before its handlers are searched.
+
+        Middleware is a function middleware(update, call_next). It passes the update on by calling call_next(update),
+        or drops it by not calling it. In a sync middleware code after call_next runs when the handlers of the update
+        are started, but before they run. Middlewares are called in order of adding. While there are middlewares,
+        updates of a batch are dispatched one by one, so update listeners receive them one at a time.
+
+        Middleware may be a coroutine function, then it has to await call_next(update) and the update goes through
+        the middlewares in a task run by the handler pool. The handlers of the update run in this task, so await
+        call_next(update) returns when they finish and raises the exception of a failed handler, code after it
+        is a post-processing stage. A sync middleware can not await, so coroutine middlewares have to be added
+        before all sync ones.
+        :param middleware:
+        :return:
+        """
+        if asyncio.iscoroutinefunction(middleware) and any(
+                not asyncio.iscoroutinefunction(added) for added in self.middlewares):
+            raise TypeError('Coroutine middleware {0!r} must be added before sync middlewares'.format(middleware))
+
+        self.middlewares.append(middleware)
+
+        process_update = self._dispatch_update
+        for middleware in reversed(self.middlewares):
+            process_update = self._chain_middleware(middleware, process_update)
+
+        self._process_update = process_update
+
+    @staticmethod
+    def _chain_middleware(middleware, call_next):
+        if not asyncio.iscoroutinefunction(middleware):
+            def process_update(update):
+                return middleware(update, call_next)
+
+            return process_update
+
+        if not asyncio.iscoroutinefunction(call_next):
+            dispatch = call_next
+
+            async def call_next(update):
+                calls = []
+                context_token = _middleware_calls.set(calls)
+                try:
+                    dispatch(update)
+                finally:
+                    _middleware_calls.reset(context_token)
+
+                results = await asyncio.gather(*[call() for call in calls], return_exceptions=True)
+                errors = [result for result in results if isinstance(result, Exception)]
+                for error in errors[1:]:
+                    logger.error('Exception in handler', exc_info=error)
+                if errors:
+                    raise errors[0]
+
+        async def process_update(update):
+            return await middleware(update, call_next)
+
+        return process_update
+
+    def _run_middlewares(self, update):
+        if asyncio.iscoroutinefunction(self._process_update):
+            self._exec_task(self._process_update, update)
+        else:
+            self._process_update(update)
+
     def add_message_handler(self, handler_dict):
         """
         Adds a message handler
@@ -148,71 +631,154 @@ class AioTGram:
         """
         self.message_handlers.append(handler_dict)
 
+    async def process_webhook_update(self, update, reply_timeout=None):
+        """
+        Processes update received by webhook.
+
+        If reply_timeout is set, the first send_message or answer_callback_query made by this bot in the handlers
+        of the update within reply_timeout seconds is not sent, it is returned to be put in the webhook response
+        instead. The method returns as soon as such call is made or all handlers finish.
+
+        Example:
+
+        async def handler(request):
+            reply = await bot.process_webhook_update(await request.body(), reply_timeout=1)
+            return JSONResponse(reply or {})
+
+        :param update: Update, or its json dict, string or bytes
+        :param reply_timeout: Seconds to wait for a call to put in the response, None disables replying
+        :return: body of the webhook response, None if there is no call to put in it
+        """
+        await self.handler_pool.wait_for_space()
+
+        if isinstance(update, types.Update):
+            process_updates = self.process_new_updates
+        else:
+            process_updates = self.process_raw_updates
+            update = types.Update.check_json(update)
+
+        if not reply_timeout:
+            process_updates([update])
+            return None
+
+        reply = webhook.WebhookReply(self.token)
+        context_token = webhook.current_reply.set(reply)
+        try:
+            process_updates([update])
+        finally:
+            webhook.current_reply.reset(context_token)
+
+        return await reply.wait(reply_timeout)
+
+    def process_raw_updates(self, updates):
+        """
+        Processes updates as they are received from the API.
+
+        The kind of an update is found by its key, kinds without handlers are skipped before deserialization.
+        :param updates: List of update dicts
+        """
+        handled_kinds = self._get_handled_kinds()
+        batches = {}
+
+        for update in updates:
+            if not self._check_update_id(update['update_id']):
+                continue
+
+            kind = None
+            for key in update:
+                if key in handled_kinds:
+                    kind = key
+                    break
+            if kind is None:
+                continue
+
+            if self._process_update is not None:
+                self._run_middlewares(types.Update.de_json(update))
+                continue
+
+            batch = batches.get(kind)
+            if batch is None:
+                batch = batches[kind] = []
+            batch.append(_UPDATE_KINDS[kind][0].de_json(update[kind]))
+
+        self._process_batches(batches)
+
     def process_new_updates(self, updates):
-        new_messages = []
-        new_edited_messages = []
-        new_channel_posts = []
-        new_edited_channel_posts = []
-        new_inline_querys = []
-        new_chosen_inline_results = []
-        new_callback_querys = []
-        new_shipping_querys = []
-        new_pre_checkout_querys = []
-        new_polls = []
-        new_poll_answers = []
+        """
+        Processes deserialized updates.
+        :param updates: List of Update
+        """
+        handled_kinds = self._get_handled_kinds()
+        batches = {}
 
         for update in updates:
-            # TODO: Add process_middlewares to enable middlewares
-
-            if update.update_id > self.last_update_id:
-                self.last_update_id = update.update_id
-            if update.message:
-                new_messages.append(update.message)
-            if update.edited_message:
-                new_edited_messages.append(update.edited_message)
-            if update.channel_post:
-                new_channel_posts.append(update.channel_post)
-            if update.edited_channel_post:
-                new_edited_channel_posts.append(update.edited_channel_post)
-            if update.inline_query:
-                new_inline_querys.append(update.inline_query)
-            if update.chosen_inline_result:
-                new_chosen_inline_results.append(update.chosen_inline_result)
-            if update.callback_query:
-                new_callback_querys.append(update.callback_query)
-            if update.shipping_query:
-                new_shipping_querys.append(update.shipping_query)
-            if update.pre_checkout_query:
-                new_pre_checkout_querys.append(update.pre_checkout_query)
-            if update.poll:
-                new_polls.append(update.poll)
-            if update.poll_answer:
-                new_poll_answers.append(update.poll_answer)
-
-        if len(new_messages) > 0:
-            self.process_new_messages(new_messages)
-        if len(new_edited_messages) > 0:
-            self.process_new_edited_messages(new_edited_messages)
-        if len(new_channel_posts) > 0:
-            self.process_new_channel_posts(new_channel_posts)
-        if len(new_edited_channel_posts) > 0:
-            self.process_new_edited_channel_posts(new_edited_channel_posts)
-        if len(new_inline_querys) > 0:
-            self.process_new_inline_query(new_inline_querys)
-        if len(new_chosen_inline_results) > 0:
-            self.process_new_chosen_inline_query(new_chosen_inline_results)
-        if len(new_callback_querys) > 0:
-            self.process_new_callback_query(new_callback_querys)
-        if len(new_shipping_querys) > 0:
-            self.process_new_shipping_query(new_shipping_querys)
-        if len(new_pre_checkout_querys) > 0:
-            self.process_new_pre_checkout_query(new_pre_checkout_querys)
-        if len(new_polls) > 0:
-            self.process_new_poll(new_polls)
-        if len(new_poll_answers) > 0:
-            self.process_new_poll_answer(new_poll_answers)
+            if not self._check_update_id(update.update_id):
+                continue
+
+            if self._process_update is not None:
+                self._run_middlewares(update)
+                continue
+
+            for kind in handled_kinds:
+                update_object = getattr(update, kind)
+                if update_object:
+                    batch = batches.get(kind)
+                    if batch is None:
+                        batch = batches[kind] = []
+                    batch.append(update_object)
+
+        self._process_batches(batches)
+
+    def _check_update_id(self, update_id):
+        """
+        Returns False for an update which was already received.
+        """
+        if self.deduplicator is not None and not self.deduplicator.check(update_id):
+            logger.debug('Dropped duplicate update %s', update_id)
+            return False
+
+        if update_id > self.last_update_id:
+            self.last_update_id = update_id
+
+        return True
+
+    def get_allowed_updates(self):
+        """
+        Returns update types which have handlers, Telegram does not send the other ones.
+        An empty list, when there are no handlers at all, makes Telegram send all types.
+        :return: list of strings
+        """
+        return self._get_handled_kinds()
+
+    def _get_handled_kinds(self):
+        """
+        Returns keys of update kinds which have handlers, in the order of _UPDATE_KINDS.
+        """
+        handled_kinds = []
+        for kind, (_, handlers, _) in _UPDATE_KINDS.items():
+            if getattr(self, handlers):
+                handled_kinds.append(kind)
+            elif kind == 'message' and (self.update_listener or self.next_step_backend.handlers
+                                        or self.reply_backend.handlers or self.session.read_cache):
+                handled_kinds.append(kind)
+
+        return handled_kinds
+
+    def _process_batches(self, batches):
+        # Kinds are processed in the same order for every batch.
+        for kind, (_, _, process_method) in _UPDATE_KINDS.items():
+            batch = batches.get(kind)
+            if batch:
+                getattr(self, process_method)(batch)
+
+    def _dispatch_update(self, update):
+        for kind, (_, _, process_method) in _UPDATE_KINDS.items():
+            update_object = getattr(update, kind)
+            if update_object:
+                getattr(self, process_method)([update_object])
 
     def process_new_messages(self, new_messages):
+        self._invalidate_read_cache(new_messages)
         self._notify_next_handlers(new_messages)
         self._notify_reply_handlers(new_messages)
         self.__notify_update(new_messages)
@@ -248,6 +814,15 @@ class AioTGram:
     def process_new_poll_answer(self, poll_answers):
         self._notify_command_handlers(self.poll_answer_handlers, poll_answers)
 
+    def _invalidate_read_cache(self, new_messages):
+        read_cache = self.session.read_cache
+        if not read_cache:
+            return
+
+        for message in new_messages:
+            if message.content_type in _CHAT_CHANGING_CONTENT_TYPES:
+                read_cache.invalidate_chat(self.token, message.chat.id)
+
     def __notify_update(self, new_messages):
         for listener in self.update_listener:
             self._exec_task(listener, new_messages)
@@ -286,59 +861,227 @@ class AioTGram:
         :param new_messages:
         :return:
         """
+        if not handlers:
+            return
+
+        if not isinstance(handlers, HandlerList):
+            handlers = HandlerList(handlers)
+
         for message in new_messages:
-            for message_handler in handlers:
-                if self._test_message_handler(message_handler, message):
-                    self._exec_task(message_handler['function'], message)
-                    break
+            position = handlers.find_position(message)
+            if position is None:
+                continue
 
-    @staticmethod
-    def _test_filter(message_filter, filter_value, message):
+            message_handler = handlers[position]
+            if self._has_blocking_filter(message_handler):
+                self._exec_task(self._notify_blocking_handlers, message, handlers, position)
+            elif message_handler.get('executor') == 'process':
+                self._exec_task(self._call_in_process, message, message_handler['function'])
+            else:
+                self._exec_task(message_handler['function'], message)
+
+    async def _notify_blocking_handlers(self, message, handlers, position):
         """
-        Test filters
-        :param message_filter:
-        :param filter_value:
+        Continues the search of a handler from a handler which func filter runs in the thread pool.
         :param message:
+        :param handlers:
+        :param position: Position of the handler which other filters passed
         :return:
         """
-        test_cases = {
-            'content_types': lambda msg: msg.content_type in filter_value,
-            'regexp': lambda msg: msg.content_type == 'text' and re.search(filter_value, msg.text, re.IGNORECASE),
-            'commands': lambda msg: msg.content_type == 'text' and util.extract_command(msg.text) in filter_value,
-            'func': lambda msg: filter_value(msg)
-        }
+        loop = asyncio.get_event_loop()
 
-        return test_cases.get(message_filter, lambda msg: False)(message)
+        while position is not None:
+            message_handler = handlers[position]
+            if message_handler.get('executor') == 'process':
+                return await self._call_in_process(message, message_handler['function'])
+            if not self._has_blocking_filter(message_handler):
+                return await self._call_handler(message_handler['function'], message)
 
-    def _test_message_handler(self, message_handler, message):
-        # TODO: rewrite it
-        """
-        Test message handler
-        :param message_handler:
-        :param message:
-        :return:
-        """
-        for message_filter, filter_value in six.iteritems(message_handler['filters']):
-            if filter_value is None:
-                continue
+            if await loop.run_in_executor(self.thread_pool, message_handler['filters']['func'], message):
+                return await self._call_handler(message_handler['function'], message)
 
-            if not self._test_filter(message_filter, filter_value, message):
-                return False
+            position = handlers.find_position(message, position + 1)
 
-        return True
+    @staticmethod
+    def _has_blocking_filter(message_handler):
+        return message_handler.get('executor') == 'thread' and message_handler['filters'].get('func') is not None
 
     @staticmethod
-    def _build_handler_dict(handler, **filters):
+    def _build_handler_dict(handler, executor=None, **filters):
         """
         Builds a dictionary for a handler
         :param handler:
+        :param executor:
         :param filters:
         :return:
         """
         return {
             'function': handler,
             'filters': filters,
+            'executor': executor,
         }
 
+    async def _call_handler(self, function, *args, **kwargs):
+        """
+        Awaits a coroutine function, other functions are called in the thread pool.
+        An awaitable returned by them, e.g. bot.send_message(...), is awaited in the event loop.
+        """
+        if asyncio.iscoroutinefunction(function):
+            return await function(*args, **kwargs)
+
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(self.thread_pool, functools.partial(function, *args, **kwargs))
+        if inspect.isawaitable(result):
+            result = await result
+
+        return result
+
+    async def _call_in_process(self, message, function):
+        """
+        Calls the handler with a MessageSlice in the process pool and makes the API calls it returns.
+        :return: list of results of the calls
+        """
+        if self.process_pool is None:
+            self.process_pool = concurrent.futures.ProcessPoolExecutor()
+            self._own_process_pool = True
+
+        loop = asyncio.get_event_loop()
+        calls = await loop.run_in_executor(
+            self.process_pool, process.run_handler, function, MessageSlice.from_message(message))
+
+        # Calls are made in the order they were returned, e.g. a message is answered before the report is sent.
+        return [await call.execute(self) for call in calls]
+
     def _exec_task(self, task, *args, **kwargs):
-        asyncio.create_task(task(*args, **kwargs))
+        calls = _middleware_calls.get()
+        if calls is not None:
+            # The middleware task already holds a worker and the lane, the handler runs in it.
+            calls.append(functools.partial(self._call_handler, task, *args, **kwargs))
+            return
+
+        function = functools.partial(self.handler_pool.run, self._call_handler, task)
+        if self.lanes is not None and args:
+            task = self.lanes.create_task(function, *args, **kwargs)
+        else:
+            task = asyncio.create_task(function(*args, **kwargs))
+        self.handler_pool.add_task(task)
+
+        reply = webhook.current_reply.get()
+        if reply is not None:
+            reply.add_task(task)
+
+
+class BotPool:
+    """
+    Hosts many bots in one process.
+
+    All bots share one RequestSession, i.e. one connection pool and the state of its rate limiter,
+    and incoming webhook updates are routed to the right bot by the path of the webhook URL.
+
+    Example:
+
+    pool = BotPool(RequestSession(rate_limiter=RateLimiter()))
+    for token in tokens:
+        bot = pool.add_bot(token)
+        bot.message_handler(commands=['start'])(start)
+
+    await pool.set_webhooks('https://example.com/webhook/')
+
+    async def handler(request):
+        reply = await pool.process_webhook_update(request.path_params['path'], await request.body())
+        return JSONResponse(reply or {})
+    """
+
+    def __init__(self, session=None):
+        """
+        :param session: RequestSession shared by all bots, a new one with defaults is created if not passed
+        """
+        self.session = session
+        if not self.session:
+            self.session = RequestSession()
+
+        self.bots = {}
+        self.paths = {}
+        self._bots_by_path = {}
+
+    def add_bot(self, token, path=None, **kwargs):
+        """
+        Creates a bot which uses the shared session.
+        :param token: Bot token
+        :param path: Path of the bot's webhook relative to the base url, derived from the token if not passed
+        :param kwargs: Other arguments of AioTGram
+        :return: AioTGram
+        """
+        bot = AioTGram(token, session=self.session, **kwargs)
+        path = path or self.make_path(token)
+
+        self.bots[token] = bot
+        self.paths[token] = path
+        self._bots_by_path[path] = bot
+
+        return bot
+
+    async def remove_bot(self, token):
+        """
+        Removes the bot from the pool and closes it, the shared session stays open.
+        :return: AioTGram
+        """
+        bot = self.bots.pop(token)
+        self._bots_by_path.pop(self.paths.pop(token), None)
+        await bot.close()
+
+        return bot
+
+    def get_bot(self, token):
+        return self.bots.get(token)
+
+    def get_bot_by_path(self, path):
+        return self._bots_by_path.get(path)
+
+    @staticmethod
+    def make_path(token):
+        """
+        Derives the webhook path from the token, so it stays the same between restarts
+        without exposing the token in the url.
+        """
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+    async def set_webhooks(self, base_url, max_connections=None):
+        """
+        Sets webhook of every bot to base_url + its path, see AioTGram.set_webhook.
+        :param base_url: Url ending with a slash
+        :param max_connections: Maximum allowed number of simultaneous HTTPS connections to each webhook, 1-100
+        """
+        await asyncio.gather(*[bot.set_webhook(base_url + self.paths[token], max_connections)
+                               for token, bot in self.bots.items()])
+
+    async def process_webhook_update(self, path, update, reply_timeout=None):
+        """
+        Routes update received by webhook to the bot which owns the path.
+        See AioTGram.process_webhook_update.
+        :param path: Path of the webhook relative to the base url
+        :param update: Update, or its json dict, string or bytes
+        :param reply_timeout: Seconds to wait for a call to put in the response, None disables replying
+        :return: body of the webhook response, None if there is no call to put in it
+        """
+        bot = self._bots_by_path.get(path)
+        if bot is None:
+            raise KeyError('No bot with webhook path {0}'.format(path))
+
+        return await bot.process_webhook_update(update, reply_timeout)
+
+    async def polling(self, **kwargs):
+        """
+        Runs polling of all bots, see AioTGram.polling.
+        """
+        await asyncio.gather(*[bot.polling(**kwargs) for bot in self.bots.values()])
+
+    def stop_polling(self):
+        for bot in self.bots.values():
+            bot.stop_polling()
+
+    async def close(self):
+        for token in list(self.bots):
+            await self.remove_bot(token)
+
+        await self.session.close()
@@ -1,81 +1,309 @@
 # -*- coding: utf-8 -*-
+import io
+import os
+import time
 import asyncio
 
 import aiohttp
 
+from yarl import URL
+
+from aiotgram import codec, util, webhook
 from aiotgram import types as bot_types
+from aiotgram.session import RequestSession
 
 
 _API_URL = 'https://api.telegram.org/bot{token}/{method_name}'
-
-_SESSION = None
+_FILE_URL = 'https://api.telegram.org/file/bot{token}/{file_path}'
 
 _READ_TIMEOUT = 5
 _DELAY_BETWEEN_REQUESTS = 10
+_DOWNLOAD_CHUNK_SIZE = 2 ** 16
+
+# Telegram limits the rate of sending messages only, other methods do not go through the rate limiter.
+_RATE_LIMITED_METHODS = {'sendMessage', 'sendPhoto', 'sendDocument', 'sendVideo', 'sendMediaGroup'}
+
+_DEFAULT_SESSION = RequestSession(read_timeout=_READ_TIMEOUT)
+_SESSIONS = {}
 
 
-async def _fetch(session, method_name, method, request_url, params):
+async def _fetch(session, method_name, method, request_url, params, **kwargs):
     try:
-        result = await session.request(method, request_url, data=params)
+        result = await session.request(method, request_url, data=params, **kwargs)
     except(aiohttp.client_exceptions.ClientConnectionError,
            asyncio.TimeoutError):
         result = None
-    except BaseException:
+    except Exception:
         msg = 'No connection to server. Used method: {}'.format(method_name)
         raise ApiException(msg, method_name)
 
     return result
 
 
-async def _get_req_session():
-    global _SESSION
-    session = _SESSION
+async def _read_body(result):
+    """
+    Reads the body of the response, it is kept by the response for _check_result.
+    :return: False if the connection broke while reading, the request is retried as if it got no response
+    """
+    try:
+        await result.read()
+    except(aiohttp.client_exceptions.ClientPayloadError,
+           aiohttp.client_exceptions.ClientConnectionError,
+           asyncio.TimeoutError):
+        result.close()
+        return False
+
+    return True
+
+
+def register_session(token, session):
+    """
+    Binds RequestSession to the token, all requests made with this token will use its connection pool.
+    :param token: Bot token
+    :param session: RequestSession instance
+    :return:
+    """
+    _SESSIONS[token] = session
 
-    if not session or session.closed:
-        _SESSION = aiohttp.ClientSession(read_timeout=_READ_TIMEOUT)
 
-    return _SESSION
+def unregister_session(token):
+    return _SESSIONS.pop(token, None)
 
 
-async def _make_request(token, method_name, method='get', params=None):
+def get_request_session(token):
+    """
+    Returns RequestSession bound to the token or the shared default one.
+    :param token: Bot token
+    :return:
+    """
+    return _SESSIONS.get(token, _DEFAULT_SESSION)
+
+
+async def _make_request(token, method_name, method='get', params=None, files=None, long_polling_timeout=None):
+    webhook_reply = webhook.current_reply.get()
+    if webhook_reply is not None and not files and webhook_reply.claim(token, method_name, params):
+        # The call is sent in the webhook response, its result is unknown.
+        return {'ok': True, 'result': None}
+
     request_url = _API_URL.format(token=token, method_name=method_name)
-    session = await _get_req_session()
+    request_session = get_request_session(token)
+    session = await request_session.get_session()
+
+    request_kwargs = {}
+    if long_polling_timeout:
+        # The server holds long polling requests, so reading of the answer has to wait longer.
+        request_kwargs['timeout'] = aiohttp.ClientTimeout(
+            sock_read=request_session.read_timeout + long_polling_timeout,
+            sock_connect=request_session.connect_timeout
+        )
+
+    rate_limiter = request_session.rate_limiter if method_name in _RATE_LIMITED_METHODS else None
+    retry_policy = request_session.retry_policy
+    circuit_breaker = request_session.circuit_breaker
+    metrics = request_session.metrics
+
+    endpoint = str(URL(request_url).origin())
+    chat_id = params.get('chat_id') if params else None
+    started = time.monotonic()
+    attempt = 0
+
+    multipart = _MultipartBody(params, files) if files else None
+
+    if metrics:
+        metrics.add_in_flight(1)
+        metrics.increment('requests', method_name)
 
     try:
-        result = await session.request(method, request_url, data=params)
-    except(aiohttp.client_exceptions.ClientConnectionError,
-           asyncio.TimeoutError):
-        result = await _fetch(session, method_name, method, request_url, params)
-    except:
-        msg = 'No connection to server. Used method: {}'.format(method_name)
-        raise ApiException(msg, method_name)
+        if rate_limiter:
+            await rate_limiter.acquire(token, chat_id)
 
-    if result.status == 429:    # code 429: too many requests
         while True:
-            # TODO: require tests for this again
-            await asyncio.sleep(_DELAY_BETWEEN_REQUESTS)
-            result = await _fetch(session, method_name, method, request_url, params)
+            if circuit_breaker and not circuit_breaker.allow(endpoint):
+                msg = 'Server {0} is unavailable, circuit breaker is open. Used method: {1}'.format(
+                    endpoint, method_name)
+                raise ApiException(msg, method_name)
+
+            attempt += 1
+            data = multipart.build() if multipart else params
+            attempt_started = time.monotonic()
+            result = await _fetch(session, method_name, method, request_url, data, **request_kwargs)
+
+            if metrics and result is not None:
+                metrics.observe('first_byte_seconds', method_name, time.monotonic() - attempt_started)
+                if result.status == 429:
+                    metrics.increment('rate_limited', method_name)
+
+            if result is not None and result.status < 500 and not await _read_body(result):
+                result = None
+
+            if metrics and result is None:
+                metrics.increment('connection_errors', method_name)
+
+            if result is None or result.status >= 500:
+                if circuit_breaker:
+                    circuit_breaker.record_failure(endpoint)
+                delay = retry_policy.get_delay(attempt)
+            elif result.status == 429:    # code 429: too many requests
+                if circuit_breaker:
+                    circuit_breaker.record_success(endpoint)
+                delay = await _get_retry_after(result)
+            else:
+                if circuit_breaker:
+                    circuit_breaker.record_success(endpoint)
+                break
 
-            if result and result.status == 200:
+            can_retry = retry_policy.can_retry(attempt, time.monotonic() - started + delay)
+            if not can_retry or (multipart and not multipart.retryable):
+                if result is None:
+                    msg = 'No connection to server. Used method: {}'.format(method_name)
+                    raise ApiException(msg, method_name)
                 break
 
-    return await _check_result(method_name, result)
+            if result is not None:
+                result.release()
+            if metrics:
+                metrics.increment('retries', method_name)
+
+            if rate_limiter and result is not None and result.status == 429:
+                rate_limiter.retry_after(token, chat_id, delay)
+                await rate_limiter.acquire(token, chat_id)
+            else:
+                await asyncio.sleep(delay)
+
+        return await _check_result(method_name, result, metrics)
+    except ApiException:
+        if metrics:
+            metrics.increment('errors', method_name)
+        raise
+    finally:
+        if multipart:
+            multipart.close()
+        if metrics:
+            metrics.add_in_flight(-1)
+            metrics.observe('request_seconds', method_name, time.monotonic() - started)
+
+
+class _MultipartBody:
+    """
+    Builds multipart/form-data body with files for every attempt of a request.
+
+    Files are streamed to the server in chunks and never read in memory as a whole:
+        - os.PathLike (e.g. pathlib.Path) is opened for every attempt and closed after the request,
+        - file object is sent from its current position and rewound to it before a retry, it stays open,
+        - bytes are sent as is,
+        - async iterator of bytes is sent as is and therefore can be sent only once.
+    """
+
+    def __init__(self, params, files):
+        self.params = params or {}
+        self.files = files
+        self.retryable = True
+
+        self._positions = {}
+        self._opened = []
+
+        for name, file in files.items():
+            if isinstance(file, (os.PathLike, bytes)):
+                continue
+            elif hasattr(file, '__aiter__'):
+                self.retryable = False
+            else:
+                try:
+                    self._positions[name] = file.tell()
+                except (AttributeError, OSError):
+                    self.retryable = False
+
+    def build(self):
+        self.close()
+
+        form = aiohttp.FormData()
+        for key, value in self.params.items():
+            form.add_field(key, str(value))
+
+        for name, file in self.files.items():
+            if isinstance(file, os.PathLike):
+                file = open(file, 'rb')
+                self._opened.append(file)
+            elif name in self._positions:
+                file.seek(self._positions[name])
+                file = _SharedFile(file)
+
+            filename = getattr(file, 'name', None)
+            filename = os.path.basename(filename) if util.is_string(filename) else name
+            form.add_field(name, file, filename=filename)
+
+        return form
+
+    def close(self):
+        for file in self._opened:
+            file.close()
+
+        self._opened = []
+
+
+class _SharedFile(io.BufferedIOBase):
+    """
+    File object of the caller passed to aiohttp.
+
+    aiohttp closes file objects after sending them (IOBasePayload.write in aiohttp 3.6.2 pinned by pyproject),
+    which would break retries and return a closed file to the caller, so close does nothing here.
+    """
+
+    def __init__(self, file):
+        super().__init__()
+        self._file = file
+        self.name = getattr(file, 'name', None)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunk = self._file.read(size)
+        return chunk.encode() if isinstance(chunk, str) else chunk
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        pass
 
 
-async def _check_result(method_name, result):
+async def _get_retry_after(result):
+    """
+    Returns the delay requested by the server in parameters.retry_after of the 429 response.
+    """
+    try:
+        result_json = codec.loads(await result.read())
+        return result_json['parameters']['retry_after']
+    except (ValueError, KeyError, TypeError):
+        return _DELAY_BETWEEN_REQUESTS
+
+
+async def _check_result(method_name, result, metrics=None):
     """
     Checks whether `result` is a valid API response.
     A result is considered invalid if:
         - The content of the result is invalid JSON.
         - The method call was unsuccessful (The JSON 'ok' field equals False)
     """
+    body = await result.read()
+    decode_started = time.monotonic()
     try:
-        result_json = await result.json()
-    except:
+        result_json = codec.loads(body)
+    except ValueError:
         msg = 'The server returned an invalid JSON response. Response body:\n[{0}]' \
-            .format(result.text)
+            .format(body.decode('utf-8', 'replace'))
         raise ApiException(msg, method_name, result)
 
+    if metrics:
+        metrics.observe('decode_seconds', method_name, time.monotonic() - decode_started)
+
     if not result_json['ok']:
         msg = 'Error code: {0} Description: {1}' \
             .format(result_json['error_code'], result_json['description'])
@@ -84,9 +312,132 @@ async def _check_result(method_name, result):
     return result_json
 
 
-async def set_webhook(token, url):
+async def get_updates(token, offset=None, limit=None, timeout=None, allowed_updates=None):
+    method_url = 'getUpdates'
+    payload = {}
+    if offset:
+        payload['offset'] = offset
+    if limit:
+        payload['limit'] = limit
+    if timeout:
+        payload['timeout'] = timeout
+    if allowed_updates is not None:
+        payload['allowed_updates'] = codec.dumps(allowed_updates)
+
+    result = await _make_request(token, method_url, method='post', params=payload, long_polling_timeout=timeout)
+    return result['result']
+
+
+async def get_me(token):
+    method_url = 'getMe'
+    return await _make_cached_request(token, method_url)
+
+
+async def get_chat(token, chat_id):
+    method_url = 'getChat'
+    payload = {'chat_id': chat_id}
+    return await _make_cached_request(token, method_url, payload)
+
+
+async def get_chat_administrators(token, chat_id):
+    method_url = 'getChatAdministrators'
+    payload = {'chat_id': chat_id}
+    return await _make_cached_request(token, method_url, payload)
+
+
+async def get_chat_member(token, chat_id, user_id):
+    method_url = 'getChatMember'
+    payload = {'chat_id': chat_id, 'user_id': user_id}
+    return await _make_cached_request(token, method_url, payload)
+
+
+async def _make_cached_request(token, method_name, params=None):
+    """
+    Makes read-only request through ReadCache of the session if it is set.
+    :return: result field of the response
+    """
+    async def fetch():
+        result = await _make_request(token, method_name, method='post', params=params)
+        return result['result']
+
+    read_cache = get_request_session(token).read_cache
+    if not read_cache:
+        return await fetch()
+
+    key = (token, method_name) + (tuple(sorted(params.items())) if params else ())
+    chat_id = params.get('chat_id') if params else None
+
+    return await read_cache.get(key, fetch, token, chat_id)
+
+
+async def get_file(token, file_id):
+    method_url = 'getFile'
+    payload = {'file_id': file_id}
+    result = await _make_request(token, method_url, method='post', params=payload)
+    return result['result']
+
+
+async def download_file(token, file_path, dest, chunk_size=_DOWNLOAD_CHUNK_SIZE):
+    """
+    Downloads file to dest writing it in chunks as the data arrives.
+    If dest already contains a part of the file, the rest of it is requested with HTTP Range.
+    Interrupted downloads are resumed according to the retry policy of the session.
+    :param token: Bot token
+    :param file_path: File path returned by getFile
+    :param dest: Path of the destination file
+    :param chunk_size: Size of chunks written to the disk
+    :return: dest
+    """
+    request_url = _FILE_URL.format(token=token, file_path=file_path)
+    request_session = get_request_session(token)
+    session = await request_session.get_session()
+    retry_policy = request_session.retry_policy
+
+    started = time.monotonic()
+    attempt = 0
+
+    async with request_session.get_download_semaphore():
+        while True:
+            attempt += 1
+            try:
+                await _download_chunks(session, request_url, dest, chunk_size)
+                return dest
+            except(aiohttp.client_exceptions.ClientConnectionError,
+                   aiohttp.client_exceptions.ClientPayloadError,
+                   asyncio.TimeoutError):
+                delay = retry_policy.get_delay(attempt)
+                if not retry_policy.can_retry(attempt, time.monotonic() - started + delay):
+                    msg = 'No connection to server. Used method: download_file'
+                    raise ApiException(msg, 'download_file')
+
+                await asyncio.sleep(delay)
+
+
+async def _download_chunks(session, request_url, dest, chunk_size):
+    offset = os.path.getsize(dest) if os.path.isfile(dest) else 0
+    headers = {'Range': 'bytes={0}-'.format(offset)} if offset else None
+
+    async with session.get(request_url, headers=headers) as response:
+        if response.status == 416:    # code 416: range not satisfiable, the file is already downloaded
+            return
+        if response.status not in (200, 206):
+            msg = 'Download failed with HTTP status {0}'.format(response.status)
+            raise ApiException(msg, 'download_file', response)
+
+        # If the server ignored Range and sent the whole file, it is written from the beginning.
+        mode = 'ab' if response.status == 206 else 'wb'
+        with open(dest, mode) as file:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                file.write(chunk)
+
+
+async def set_webhook(token, url, max_connections=None, allowed_updates=None):
     method_url = 'setWebhook'
     payload = {'url': url}
+    if max_connections:
+        payload['max_connections'] = max_connections
+    if allowed_updates is not None:
+        payload['allowed_updates'] = codec.dumps(allowed_updates)
 
     await _make_request(
         token,
@@ -105,9 +456,24 @@ async def send_message(token, chat_id, text,
     method_url = 'sendMessage'
     payload = {'chat_id': chat_id, 'text': text}
     if reply_markup:
-        payload['reply_markup'] = await _convert_markup(reply_markup)
+        payload['reply_markup'] = _convert_markup(reply_markup)
+
+    return await _make_request(token, method_url, method='post', params=payload)
+
 
-    await _make_request(token, method_url, method='post', params=payload)
+async def answer_callback_query(token, callback_query_id, text=None, show_alert=None, url=None, cache_time=None):
+    method_url = 'answerCallbackQuery'
+    payload = {'callback_query_id': callback_query_id}
+    if text:
+        payload['text'] = text
+    if show_alert is not None:
+        payload['show_alert'] = codec.dumps(show_alert)
+    if url:
+        payload['url'] = url
+    if cache_time is not None:
+        payload['cache_time'] = cache_time
+
+    return await _make_request(token, method_url, method='post', params=payload)
 
 
 async def send_notification(token, chat_id, text,
@@ -118,9 +484,75 @@ async def send_notification(token, chat_id, text,
     await _make_request(token, method_url, params=payload)
 
 
-async def _convert_markup(markup):
-    if isinstance(markup, bot_types.JsonDeserializable):
-        return await markup.to_json()
+async def send_photo(token, chat_id, photo, caption=None, reply_markup=None, parse_mode=None):
+    return await _send_file(token, chat_id, 'sendPhoto', 'photo', photo,
+                            caption=caption, reply_markup=reply_markup, parse_mode=parse_mode)
+
+
+async def send_document(token, chat_id, document, caption=None, reply_markup=None, parse_mode=None):
+    return await _send_file(token, chat_id, 'sendDocument', 'document', document,
+                            caption=caption, reply_markup=reply_markup, parse_mode=parse_mode)
+
+
+async def send_video(token, chat_id, video, duration=None, caption=None, reply_markup=None, parse_mode=None,
+                     supports_streaming=None):
+    return await _send_file(token, chat_id, 'sendVideo', 'video', video,
+                            caption=caption, reply_markup=reply_markup, parse_mode=parse_mode,
+                            duration=duration, supports_streaming=supports_streaming)
+
+
+async def send_media_group(token, chat_id, media, disable_notification=None, reply_to_message_id=None):
+    method_url = 'sendMediaGroup'
+    media_json, files = _convert_input_media_array(media)
+    payload = {'chat_id': chat_id, 'media': media_json}
+    if disable_notification is not None:
+        payload['disable_notification'] = codec.dumps(disable_notification)
+    if reply_to_message_id:
+        payload['reply_to_message_id'] = reply_to_message_id
+
+    return await _make_request(token, method_url, method='post', params=payload, files=files or None)
+
+
+async def _send_file(token, chat_id, method_url, data_type, data, caption=None, reply_markup=None,
+                     parse_mode=None, **kwargs):
+    """
+    Sends a file given as file_id or URL string, os.PathLike, file object or async iterator of bytes.
+    """
+    payload = {'chat_id': chat_id}
+    files = None
+    if util.is_string(data):
+        payload[data_type] = data
+    else:
+        files = {data_type: data}
+
+    if caption:
+        payload['caption'] = caption
+    if reply_markup:
+        payload['reply_markup'] = _convert_markup(reply_markup)
+    if parse_mode:
+        payload['parse_mode'] = parse_mode
+    for key, value in kwargs.items():
+        if value is not None:
+            payload[key] = codec.dumps(value) if isinstance(value, bool) else value
+
+    return await _make_request(token, method_url, method='post', params=payload, files=files)
+
+
+def _convert_input_media_array(array):
+    media = []
+    files = {}
+    for input_media in array:
+        media_dict = input_media.to_dict()
+        if media_dict['media'].startswith('attach://'):
+            files[media_dict['media'][len('attach://'):]] = input_media.media
+        media.append(media_dict)
+
+    return codec.dumps(media), files
+
+
+def _convert_markup(markup):
+    if isinstance(markup, bot_types.JsonSerializable):
+        return markup.to_json()
 
     return markup
 
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains bulk sending of one message to many chats.
+
+Classes:
+- BroadcastResult
+- BroadcastCheckpoint
+"""
+
+import os
+import asyncio
+
+from aiotgram import apihelper, codec
+
+
+class BroadcastResult:
+    """
+    Result of sending the broadcast message to one chat.
+    """
+
+    def __init__(self, chat_id, message=None, error=None):
+        """
+        :param chat_id: Recipient chat
+        :param message: Sent types.Message if the request succeeded
+        :param error: apihelper.ApiException if the request failed
+        """
+        self.chat_id = chat_id
+        self.message = message
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class BroadcastCheckpoint:
+    """
+    Stores progress of a broadcast in a file, so an interrupted run is resumed instead of restarted.
+
+    Recipients are identified by their position in chat_ids, therefore a resumed run must iterate
+    chat_ids in the same order. The file is kept after the broadcast is finished, remove it before
+    starting a new broadcast with the same filename.
+    """
+
+    def __init__(self, filename='./.handler-saves/broadcast.save', save_every=100):
+        """
+        :param filename: Filename of save file
+        :param save_every: Number of sent messages between saves
+        """
+        self.filename = filename
+        self.save_every = save_every
+
+        # All recipients before position are done, done holds finished recipients after it.
+        self.position = 0
+        self.done = set()
+        self._unsaved = 0
+
+        self.load()
+
+    def is_done(self, index):
+        return index < self.position or index in self.done
+
+    def mark_done(self, index):
+        self.done.add(index)
+        while self.position in self.done:
+            self.done.remove(self.position)
+            self.position += 1
+
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def load(self):
+        if os.path.isfile(self.filename) and os.path.getsize(self.filename) > 0:
+            with open(self.filename, 'r') as file:
+                state = codec.loads(file.read())
+
+            self.position = state['position']
+            self.done = set(state['done'])
+
+    def save(self):
+        dirs = os.path.dirname(self.filename)
+        if dirs:
+            os.makedirs(dirs, exist_ok=True)
+
+        with open(self.filename + '.tmp', 'w') as file:
+            file.write(codec.dumps({'position': self.position, 'done': list(self.done)}))
+
+        os.replace(self.filename + '.tmp', self.filename)
+        self._unsaved = 0
+
+
+async def broadcast(bot, chat_ids, text, reply_markup=None, concurrency=20, checkpoint=None):
+    """
+    Sends text to every chat from chat_ids keeping at most `concurrency` requests in flight.
+    Results are yielded in order of completion.
+
+    :param bot: AioTGram instance
+    :param chat_ids: Iterable of chat ids, it is consumed lazily
+    :param text: Text of the message
+    :param reply_markup: Optional markup, it is serialized once for all recipients
+    :param concurrency: Maximum number of simultaneous requests
+    :param checkpoint: Optional BroadcastCheckpoint to skip recipients done by a previous run
+    :return: async iterator of BroadcastResult
+    """
+    if reply_markup:
+        reply_markup = apihelper._convert_markup(reply_markup)
+
+    recipients = enumerate(chat_ids)
+    exhausted = False
+    pending = set()
+
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                recipient = next(recipients, None)
+                if recipient is None:
+                    exhausted = True
+                    break
+
+                index, chat_id = recipient
+                if checkpoint and checkpoint.is_done(index):
+                    continue
+
+                pending.add(asyncio.create_task(_send(bot, index, chat_id, text, reply_markup)))
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index, result = task.result()
+                if checkpoint:
+                    checkpoint.mark_done(index)
+
+                yield result
+    finally:
+        for task in pending:
+            task.cancel()
+
+        if checkpoint:
+            checkpoint.save()
+
+
+async def _send(bot, index, chat_id, text, reply_markup):
+    try:
+        message = await bot.send_message(chat_id, text, reply_markup)
+    except apihelper.ApiException as e:
+        return index, BroadcastResult(chat_id, error=e)
+
+    return index, BroadcastResult(chat_id, message=message)
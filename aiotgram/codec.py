@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains the JSON codec used for requests, responses and all types.
+
+The fastest installed library is used by default: orjson, ujson or the standard json.
+Another one can be chosen with set_codec, the choice applies to the whole process.
+
+Functions:
+- loads
+- dumps
+- set_codec
+- get_codec
+"""
+
+import json
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj).decode('utf-8')
+
+
+_CODECS = {'json': (json.loads, json.dumps)}
+if ujson is not None:
+    _CODECS['ujson'] = (ujson.loads, ujson.dumps)
+if orjson is not None:
+    _CODECS['orjson'] = (orjson.loads, _orjson_dumps)
+
+_codec_name = None
+
+# Replaced by set_codec, call them as codec.loads / codec.dumps to pick up the change.
+loads = None
+dumps = None
+
+
+def set_codec(name):
+    """
+    Sets JSON library used for encoding and decoding.
+    :param name: 'orjson', 'ujson' or 'json'
+    """
+    global loads, dumps, _codec_name
+
+    if name not in _CODECS:
+        raise ValueError('JSON codec {0} is not installed, available: {1}'.format(name, ', '.join(_CODECS)))
+
+    loads, dumps = _CODECS[name]
+    _codec_name = name
+
+
+def get_codec():
+    return _codec_name
+
+
+set_codec(next(name for name in ('orjson', 'ujson', 'json') if name in _CODECS))
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains indexed lookup of handlers and deduplication of updates.
+
+Classes:
+- HandlerList
+- HandlerIndex
+- RegexpSet
+- UpdateDeduplicator
+"""
+
+import re
+import heapq
+
+from bisect import bisect_left
+from collections import defaultdict
+
+from aiotgram import util
+
+
+_KNOWN_FILTERS = ('commands', 'regexp', 'func', 'content_types')
+
+# Numbered and named backreferences and conditional groups change their meaning inside another pattern.
+_GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+_NOT_SEARCHED = object()
+
+
+class HandlerList(list):
+    """
+    List of handler dicts which keeps an index of them for finding the first matching handler.
+
+    append compiles the handler into the index, so invalid filters (e.g. a bad regexp) raise at registration.
+    Any other change of the list drops the index and it is rebuilt on the next lookup.
+    """
+
+    def __init__(self, *args):
+        super(HandlerList, self).__init__(*args)
+        self._index = None
+
+    def append(self, handler):
+        if self._index is None:
+            self._index = HandlerIndex(self)
+
+        # The index is not changed if compiling fails, the handler is added to the list after it.
+        self._index.add(len(self), handler)
+        super(HandlerList, self).append(handler)
+
+    def find(self, message):
+        """
+        Returns the first handler in order of registration which filters pass for message.
+        Filters run in the thread pool (executor='thread') are not called, see find_position.
+        :param message: Message or other update object
+        :return: handler dict or None
+        """
+        position = self.find_position(message)
+
+        return self[position] if position is not None else None
+
+    def find_position(self, message, start=0):
+        """
+        Returns position of the first handler not before start which filters pass for message.
+        The func filter of a handler with executor='thread' is not called, the caller has to call it.
+        :param message: Message or other update object
+        :param start: Position to start from
+        :return: position or None
+        """
+        if self._index is None:
+            self._index = HandlerIndex(self)
+
+        return self._index.find(message, start)
+
+
+def _invalidating(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._index = None
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ('insert', 'extend', 'remove', 'pop', 'clear', 'sort', 'reverse',
+              '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(HandlerList, _name, _invalidating(_name))
+
+
+class HandlerIndex:
+    """
+    Handlers compiled for dispatching.
+
+    Handlers with commands are found by the command in a hash map, handlers with content_types by the content
+    type of the message, regexp filters are prefiltered by one search of RegexpSet and only func filters are
+    called for every candidate. Candidates are visited in order of registration, so the result is the same as of
+    testing all handlers one by one.
+    """
+
+    def __init__(self, handlers=()):
+        self.handlers = []
+        self.by_command = defaultdict(list)
+        self.by_content_type = defaultdict(list)
+        self.any_type = []
+        self.regexps = RegexpSet()
+
+        for position, handler in enumerate(handlers):
+            self.add(position, handler)
+
+    def add(self, position, handler):
+        compiled = _CompiledHandler(handler)
+        self.handlers.append(compiled)
+
+        if compiled.never_matches:
+            return
+
+        if compiled.regexp is not None and self.regexps.add(position, compiled.regexp.pattern):
+            compiled.regexp = None
+            compiled.merged_regexp = True
+
+        if compiled.commands is not None:
+            for command in compiled.commands:
+                self.by_command[command].append(position)
+        elif compiled.content_types is not None:
+            for content_type in compiled.content_types:
+                self.by_content_type[content_type].append(position)
+            compiled.content_types = None
+        else:
+            self.any_type.append(position)
+
+    def find(self, message, start=0):
+        content_type = getattr(message, 'content_type', None)
+
+        candidates = []
+        if self.any_type:
+            candidates.append(self.any_type)
+        if content_type is not None:
+            by_content_type = self.by_content_type.get(content_type)
+            if by_content_type:
+                candidates.append(by_content_type)
+            if content_type == 'text' and self.by_command:
+                by_command = self.by_command.get(util.extract_command(message.text))
+                if by_command:
+                    candidates.append(by_command)
+
+        if not candidates:
+            return None
+
+        if start:
+            candidates = [positions[bisect_left(positions, start):] for positions in candidates]
+
+        # Position of the first handler not before the current one which merged regexp matches the text.
+        regexp_position = _NOT_SEARCHED
+
+        positions = candidates[0] if len(candidates) == 1 else heapq.merge(*candidates)
+        for position in positions:
+            compiled = self.handlers[position]
+
+            if compiled.merged_regexp:
+                if content_type != 'text':
+                    continue
+                if regexp_position is _NOT_SEARCHED:
+                    regexp_position = self.regexps.search(message.text, position)
+                elif regexp_position is not None and regexp_position < position:
+                    regexp_position = self.regexps.search(message.text, position, check_merged=False)
+                if regexp_position != position:
+                    continue
+
+            if compiled.test(message):
+                return position
+
+        return None
+
+
+class _CompiledHandler:
+    __slots__ = ('handler', 'commands', 'content_types', 'regexp', 'merged_regexp', 'func', 'never_matches')
+
+    # Executors which run the func filter outside the event loop.
+    BLOCKING_EXECUTORS = ('thread',)
+
+    def __init__(self, handler):
+        filters = handler['filters']
+
+        self.handler = handler
+        self.commands = filters.get('commands')
+        self.content_types = filters.get('content_types')
+        self.regexp = filters.get('regexp')
+        self.func = filters.get('func') if handler.get('executor') not in self.BLOCKING_EXECUTORS else None
+        self.merged_regexp = False
+
+        if self.regexp is not None:
+            self.regexp = re.compile(self.regexp, re.IGNORECASE)
+        if self.content_types is not None:
+            self.content_types = frozenset(self.content_types)
+
+        # Unknown filters never pass, test covers only the known ones.
+        self.never_matches = any(value is not None for name, value in filters.items() if name not in _KNOWN_FILTERS)
+
+    def test(self, message):
+        """
+        Tests filters which are not covered by the index, except blocking func filters.
+        """
+        if self.content_types is not None and message.content_type not in self.content_types:
+            return False
+        if self.regexp is not None and not (message.content_type == 'text' and self.regexp.search(message.text)):
+            return False
+        if self.func is not None and not self.func(message):
+            return False
+
+        return True
+
+
+class RegexpSet:
+    """
+    Patterns of regexp filters merged into one pattern.
+
+    Most texts match none of the patterns, one search of the merged alternation tells it exactly. Only when it
+    finds something, patterns are searched one by one in order of registration for the first matching handler.
+    The alternation has no capturing groups of its own, they would disable the optimizations of the re module.
+    Patterns which can not be embedded (backreferences, named groups, global inline flags) are not merged.
+    """
+
+    def __init__(self):
+        self.positions = []
+        self._patterns = []
+        self._merged = None
+
+    def add(self, position, pattern):
+        """
+        Merges pattern of the handler at position, positions must be added in ascending order.
+        :return: False if the pattern can not be merged
+        """
+        if _GROUP_REFERENCE.search(pattern):
+            return False
+
+        try:
+            compiled = re.compile(pattern)
+        except re.error:
+            return False
+
+        # Before Python 3.11 a global inline flag in the middle of a pattern is only a warning and applies to the
+        # whole alternation, e.g. (?x) of one pattern would drop whitespace of all the others.
+        if compiled.groupindex or compiled.flags & ~re.UNICODE:
+            return False
+
+        self.positions.append(position)
+        self._patterns.append(re.compile(pattern, re.IGNORECASE))
+        self._merged = None
+
+        return True
+
+    def search(self, text, start=0, check_merged=True):
+        """
+        Returns position of the first handler not before start which pattern is found in text.
+        :param text: Text of the message
+        :param start: Position of the handler to start from
+        :param check_merged: False if the merged pattern is already known to match text
+        :return: position or None
+        """
+        if not self.positions:
+            return None
+
+        if check_merged:
+            if self._merged is None:
+                patterns = dict.fromkeys(pattern.pattern for pattern in self._patterns)
+                self._merged = re.compile('|'.join('(?:{0})'.format(pattern) for pattern in patterns), re.IGNORECASE)
+            if not self._merged.search(text):
+                return None
+
+        for i in range(bisect_left(self.positions, start), len(self.positions)):
+            if self._patterns[i].search(text):
+                return self.positions[i]
+
+        return None
+
+
+class UpdateDeduplicator:
+    """
+    Remembers the last `window` update ids in a ring of bits to drop updates delivered twice.
+
+    Telegram delivers a webhook update again if the response was not received in time. Update ids are
+    sequential, so a bit per id of the window is enough: a new id above the window moves it and clears
+    the bits left behind. An id far below the window is taken as the start of a new sequence, Telegram
+    starts one at a random id after a week without updates.
+    """
+
+    def __init__(self, window=65536):
+        """
+        :param window: Number of the last update ids remembered
+        """
+        self.window = window
+        self.dropped = 0
+
+        self._bits = bytearray((window + 7) // 8)
+        self._last_update_id = None
+
+    def check(self, update_id):
+        """
+        Remembers update_id.
+        :return: False if it was seen already
+        """
+        last_update_id = self._last_update_id
+
+        if last_update_id is None or update_id <= last_update_id - self.window:
+            self._bits[:] = bytes(len(self._bits))
+            self._last_update_id = update_id
+        elif update_id > last_update_id:
+            if update_id - last_update_id >= self.window:
+                self._bits[:] = bytes(len(self._bits))
+            else:
+                for skipped_id in range(last_update_id + 1, update_id):
+                    index = skipped_id % self.window
+                    self._bits[index >> 3] &= ~(1 << (index & 7)) & 0xff
+            self._last_update_id = update_id
+        else:
+            index = update_id % self.window
+            if self._bits[index >> 3] & (1 << (index & 7)):
+                self.dropped += 1
+                return False
+
+        index = update_id % self.window
+        self._bits[index >> 3] |= 1 << (index & 7)
+
+        return True
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains a local fake Telegram Bot API server for benchmarks and tests without network.
+
+Example:
+
+async with FakeBotApiServer(latency=0.05, rate_limit_rate=0.01) as server:
+    bot = AioTGram('123:TOKEN')
+    await bot.send_message(1, 'Hello')
+    print(server.requests['sendMessage'])
+
+Classes:
+- FakeBotApiServer
+"""
+
+import time
+import random
+import socket
+import asyncio
+
+from collections import Counter
+
+from aiohttp import web
+
+from aiotgram import apihelper, codec
+
+
+class FakeBotApiServer:
+    """
+    In-process HTTP server answering Bot API methods with configurable latency and failures.
+
+    While the server is running, apihelper sends all requests to it. Failures are drawn from a random
+    generator created with `seed`, so a benchmark with the same settings produces the same answers.
+
+    Supported methods: getMe, sendMessage, sendPhoto, sendDocument, sendVideo, sendMediaGroup,
+    getUpdates, setWebhook, deleteWebhook, getFile and downloading of files, other methods answer
+    with {'ok': True, 'result': True}.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, rate_limit_rate=0, retry_after=1,
+                 error_rate=0, seed=0):
+        """
+        :param host: Interface to listen on
+        :param port: Port to listen on, 0 picks a free port
+        :param latency: Seconds every answer is delayed, or (min, max) tuple for a random delay
+        :param rate_limit_rate: Share of requests answered with 429 Too Many Requests
+        :param retry_after: Value of parameters.retry_after in 429 answers
+        :param error_rate: Share of requests answered with 500 Internal Server Error
+        :param seed: Seed of the random generator
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+
+        self.requests = Counter()
+        self.files = {}
+        self.webhook_url = ''
+
+        self._random = random.Random(seed)
+        self._updates = []
+        self._new_updates = None
+        self._last_update_id = 0
+        self._message_id = 0
+        self._runner = None
+        self._urls = None
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(self.host, self.port)
+
+    async def start(self):
+        app = web.Application(client_max_size=2 ** 31)
+        app.router.add_route('*', '/bot{token}/{method_name}', self._handle_method)
+        app.router.add_get('/file/bot{token}/{file_path:.+}', self._handle_file)
+
+        sock = socket.socket()
+        sock.bind((self.host, self.port))
+        self.port = sock.getsockname()[1]
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.SockSite(self._runner, sock).start()
+
+        self._new_updates = asyncio.Event()
+        self._urls = apihelper._API_URL, apihelper._FILE_URL
+        apihelper._API_URL = self.url + '/bot{token}/{method_name}'
+        apihelper._FILE_URL = self.url + '/file/bot{token}/{file_path}'
+
+    async def stop(self):
+        if self._urls:
+            apihelper._API_URL, apihelper._FILE_URL = self._urls
+            self._urls = None
+
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    def add_update(self, update):
+        """
+        Queues update for getUpdates, update_id is assigned if it is missing.
+        :param update: dict in the format of the Bot API Update
+        :return: update
+        """
+        if 'update_id' not in update:
+            self._last_update_id += 1
+            update['update_id'] = self._last_update_id
+        else:
+            self._last_update_id = max(self._last_update_id, update['update_id'])
+
+        self._updates.append(update)
+        self._new_updates.set()
+
+        return update
+
+    def add_message_update(self, chat_id, text, **kwargs):
+        """
+        Queues update with a text message from a private chat.
+        """
+        message = self._make_message(chat_id, text=text, **kwargs)
+        message['from'] = {'id': chat_id, 'is_bot': False, 'first_name': 'User'}
+
+        return self.add_update({'message': message})
+
+    def add_file(self, file_path, content):
+        """
+        Makes content available through getFile and file downloading.
+        :param file_path: file_id and file_path of the file
+        :param content: bytes
+        """
+        self.files[file_path] = content
+
+    async def _handle_method(self, request):
+        method_name = request.match_info['method_name']
+        self.requests[method_name] += 1
+
+        params = dict(await request.post())
+        params.update(request.query)
+
+        await self._delay()
+
+        if self._random.random() < self.rate_limit_rate:
+            return self._error(429, 'Too Many Requests: retry after {0}'.format(self.retry_after),
+                               {'retry_after': self.retry_after})
+        if self._random.random() < self.error_rate:
+            return self._error(500, 'Internal Server Error')
+
+        if method_name == 'getUpdates':
+            return self._ok(await self._get_updates(params))
+
+        handler = getattr(self, '_method_' + method_name, None)
+        result = handler(params) if handler else True
+        if isinstance(result, web.Response):
+            return result
+
+        return self._ok(result)
+
+    async def _handle_file(self, request):
+        self.requests['downloadFile'] += 1
+        content = self.files.get(request.match_info['file_path'])
+        if content is None:
+            return web.Response(status=404)
+
+        await self._delay()
+
+        start = 0
+        status = 200
+        range_header = request.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            start = int(range_header[len('bytes='):].split('-')[0])
+            if start >= len(content):
+                return web.Response(status=416)
+            status = 206
+
+        return web.Response(status=status, body=content[start:])
+
+    async def _get_updates(self, params):
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 100))
+        timeout = float(params.get('timeout', 0))
+
+        # Updates before offset are confirmed and never returned again.
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        return self._updates[:limit]
+
+    def _method_getMe(self, params):
+        return {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+
+    def _method_setWebhook(self, params):
+        self.webhook_url = params.get('url', '')
+        return True
+
+    def _method_deleteWebhook(self, params):
+        self.webhook_url = ''
+        return True
+
+    def _method_getFile(self, params):
+        file_id = params.get('file_id')
+        if file_id not in self.files:
+            return self._error(400, 'Bad Request: invalid file_id')
+
+        return {'file_id': file_id, 'file_size': len(self.files[file_id]), 'file_path': file_id}
+
+    def _method_sendMessage(self, params):
+        return self._make_message(params['chat_id'], text=params.get('text'))
+
+    def _method_sendPhoto(self, params):
+        file_id = self._store_file(params['photo'])
+        return self._make_message(params['chat_id'], photo=[{'file_id': file_id, 'width': 1, 'height': 1}])
+
+    def _method_sendDocument(self, params):
+        return self._make_message(params['chat_id'], document={'file_id': self._store_file(params['document'])})
+
+    def _method_sendVideo(self, params):
+        file_id = self._store_file(params['video'])
+        return self._make_message(params['chat_id'], video={'file_id': file_id, 'width': 1, 'height': 1,
+                                                            'duration': 1})
+
+    def _method_sendMediaGroup(self, params):
+        messages = []
+        for media in codec.loads(params['media']):
+            data = media['media']
+            if data.startswith('attach://'):
+                data = params[data[len('attach://'):]]
+
+            file_id = self._store_file(data)
+            if media['type'] == 'photo':
+                messages.append(self._make_message(params['chat_id'],
+                                                   photo=[{'file_id': file_id, 'width': 1, 'height': 1}]))
+            else:
+                messages.append(self._make_message(params['chat_id'], document={'file_id': file_id}))
+
+        return messages
+
+    def _store_file(self, data):
+        if isinstance(data, str):
+            return data
+
+        file_id = 'file{0}'.format(len(self.files) + 1)
+        self.files[file_id] = data.file.read()
+
+        return file_id
+
+    def _make_message(self, chat_id, **kwargs):
+        self._message_id += 1
+        chat_id = int(chat_id)
+        message = {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'},
+        }
+        message.update(kwargs)
+
+        return message
+
+    async def _delay(self):
+        latency = self.latency
+        if isinstance(latency, tuple):
+            latency = self._random.uniform(*latency)
+        if latency:
+            await asyncio.sleep(latency)
+
+    @staticmethod
+    def _ok(result):
+        return web.json_response({'ok': True, 'result': result}, dumps=codec.dumps)
+
+    @staticmethod
+    def _error(error_code, description, parameters=None):
+        body = {'ok': False, 'error_code': error_code, 'description': description}
+        if parameters:
+            body['parameters'] = parameters
+
+        return web.json_response(body, status=error_code, dumps=codec.dumps)
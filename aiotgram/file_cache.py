@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains caches which map content of uploaded files to file_id returned by Telegram,
+so the same content is sent by file_id instead of being uploaded again.
+
+file_id is valid only for the bot which uploaded the file, so a cache must not be shared between bots.
+
+Classes:
+- FileIdCache
+- MemoryFileIdCache
+- DiskFileIdCache
+"""
+
+import os
+import shelve
+import asyncio
+import hashlib
+import concurrent.futures
+
+from collections import OrderedDict
+
+from abc import ABCMeta, abstractmethod
+
+
+_HASH_CHUNK_SIZE = 2 ** 16
+
+
+class FileIdCache(metaclass=ABCMeta):
+    """
+    Class for caching file_id of uploaded files
+    """
+
+    @abstractmethod
+    async def get(self, key):
+        pass
+
+    @abstractmethod
+    async def set(self, key, file_id):
+        pass
+
+    async def close(self):
+        """
+        Called by AioTGram.close.
+        """
+        pass
+
+
+class MemoryFileIdCache(FileIdCache):
+    def __init__(self, max_size=10000):
+        """
+        :param max_size: Maximum number of files, the least recently used ones are removed first.
+        """
+        self.max_size = max_size
+        self.file_ids = OrderedDict()
+
+    async def get(self, key):
+        file_id = self.file_ids.get(key)
+        if file_id is not None:
+            self.file_ids.move_to_end(key)
+
+        return file_id
+
+    async def set(self, key, file_id):
+        self.file_ids[key] = file_id
+        self.file_ids.move_to_end(key)
+
+        while len(self.file_ids) > self.max_size:
+            self.file_ids.popitem(last=False)
+
+
+class DiskFileIdCache(FileIdCache):
+    """
+    Keeps file_ids in a shelve database.
+
+    The database is used in a thread of its own, so reading and syncing it does not block the event loop,
+    and it is opened in that thread on first use as some dbm backends can not be used from other threads.
+    """
+
+    def __init__(self, filename='./.handler-saves/file_ids'):
+        """
+        :param filename: Filename of the shelve database
+        """
+        dirs = os.path.dirname(filename)
+        if dirs:
+            os.makedirs(dirs, exist_ok=True)
+
+        self.filename = filename
+        self.file_ids = None
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def get(self, key):
+        return await self._run(self._get, key)
+
+    async def set(self, key, file_id):
+        await self._run(self._set, key, file_id)
+
+    async def close(self):
+        if self._executor is None:
+            return
+
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+        self._executor = None
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    def _open(self):
+        if self.file_ids is None:
+            self.file_ids = shelve.open(self.filename)
+
+        return self.file_ids
+
+    def _get(self, key):
+        return self._open().get(key)
+
+    def _set(self, key, file_id):
+        file_ids = self._open()
+        file_ids[key] = file_id
+        file_ids.sync()
+
+    def _close(self):
+        if self.file_ids is not None:
+            self.file_ids.close()
+            self.file_ids = None
+
+
+async def make_key(file, media_type):
+    """
+    Returns cache key of file or None if the file can not be cached.
+        - os.PathLike: absolute path, modification time and size, the content is not read,
+        - bytes: SHA-256 of the content,
+        - seekable file object: SHA-256 of the content after the current position, the position is restored.
+    The key starts with media_type, Telegram does not accept file_id of a photo in sendDocument and vice versa.
+    Hashing is done in the default executor, so the event loop is not blocked by big files.
+    :param file: File as it is passed to send_document and similar methods
+    :param media_type: How the file is sent: 'photo', 'document', 'video'...
+    :return:
+    """
+    if isinstance(file, os.PathLike):
+        stat = os.stat(file)
+        return '{0}:path:{1}:{2}:{3}'.format(media_type, os.path.abspath(file), stat.st_mtime_ns, stat.st_size)
+
+    loop = asyncio.get_running_loop()
+    if isinstance(file, bytes):
+        key = await loop.run_in_executor(None, _hash_bytes, file)
+    elif hasattr(file, 'read') and hasattr(file, 'seek') and hasattr(file, 'tell'):
+        key = await loop.run_in_executor(None, _hash_file_object, file)
+    else:
+        return None
+
+    return '{0}:{1}'.format(media_type, key)
+
+
+def _hash_bytes(data):
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+def _hash_file_object(file):
+    digest = hashlib.sha256()
+    position = file.tell()
+    try:
+        while True:
+            chunk = file.read(_HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    finally:
+        file.seek(position)
+
+    return 'sha256:' + digest.hexdigest()
+
+
+def get_file_id(message):
+    """
+    Returns file_id of the file sent with message.
+    :param message: types.Message
+    :return:
+    """
+    if message.photo:
+        return message.photo[-1].file_id
+
+    for content in (message.video, message.document, message.audio, message.animation,
+                    message.voice, message.video_note, message.sticker):
+        if content is not None:
+            return content.file_id
+
+    return None
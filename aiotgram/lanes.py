@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains ordered execution of handlers per chat.
+
+Classes:
+- ChatLanes
+"""
+
+import asyncio
+import functools
+
+
+class ChatLanes:
+    """
+    Runs handlers of one chat (or user) one after another in order of arrival, handlers of different chats
+    run concurrently.
+
+    Every handler is still a separate task, it waits for the previous task of its chat before it starts.
+    The lane of a chat is its last task and it is dropped as soon as that task finishes, so idle chats
+    take no memory.
+    """
+
+    KEYS = ('chat', 'user')
+
+    def __init__(self, key='chat'):
+        """
+        :param key: 'chat' to serialize handlers per chat, 'user' to serialize them per user
+        """
+        if key not in self.KEYS:
+            raise ValueError('key must be one of {0}, not {1!r}'.format(self.KEYS, key))
+
+        self.key = key
+        self._lanes = {}
+
+    def __len__(self):
+        """
+        Returns the number of chats which handlers are running or waiting.
+        """
+        return len(self._lanes)
+
+    def get_key(self, update):
+        """
+        Returns id of the chat or the user of update, None if it has none.
+        :param update: Update, Message, CallbackQuery, InlineQuery and so on
+        """
+        if hasattr(update, 'update_id'):
+            # Update holds one object of its kind, the others are None.
+            update = next((value for name, value in vars(update).items()
+                           if name != 'update_id' and value is not None), None)
+
+        if self.key == 'chat':
+            chat = getattr(update, 'chat', None) or getattr(getattr(update, 'message', None), 'chat', None)
+            if chat is not None:
+                return chat.id
+
+        # Private chats have the same id as their user, so updates without a chat share the user's lane.
+        user = getattr(update, 'from_user', None) or getattr(update, 'user', None)
+
+        return user.id if user is not None else None
+
+    def create_task(self, function, update, *args, **kwargs):
+        """
+        Schedules function(update, *args, **kwargs) in the lane of update.
+        Updates without a chat or a user are not ordered.
+        :return: asyncio.Task
+        """
+        key = self.get_key(update)
+        if key is None:
+            return asyncio.ensure_future(function(update, *args, **kwargs))
+
+        task = asyncio.ensure_future(self._run(self._lanes.get(key), function, update, *args, **kwargs))
+        self._lanes[key] = task
+        task.add_done_callback(functools.partial(self._release, key))
+
+        return task
+
+    @staticmethod
+    async def _run(previous, function, *args, **kwargs):
+        if previous is not None:
+            # asyncio.wait neither raises exceptions of the previous handler nor is cancelled with it.
+            await asyncio.wait([previous])
+
+        return await function(*args, **kwargs)
+
+    def _release(self, key, task):
+        if self._lanes.get(key) is task:
+            del self._lanes[key]
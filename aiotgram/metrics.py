@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains instrumentation of requests to the Telegram Bot API.
+
+A sink is attached to RequestSession(metrics=...). Without a sink apihelper skips all measurements.
+
+Measurements, every one is labeled with the API method name:
+    - histograms: request_seconds (whole call including retries), first_byte_seconds (every attempt,
+      until the response headers are received), decode_seconds (JSON decoding of the response),
+    - counters: requests, errors, retries, rate_limited (429 answers), connection_errors,
+    - gauge: in_flight (calls being made right now, without a method label).
+
+Classes:
+- MetricsSink
+- PrometheusMetrics
+"""
+
+from abc import ABCMeta, abstractmethod
+from bisect import bisect_left
+from collections import defaultdict
+
+
+class MetricsSink(metaclass=ABCMeta):
+    """
+    Receives measurements of requests, subclass it to send them to StatsD, logs and so on.
+    """
+
+    @abstractmethod
+    def observe(self, name, method_name, value):
+        """
+        Records value of a histogram.
+        :param name: Histogram name
+        :param method_name: API method name
+        :param value: Seconds
+        """
+        pass
+
+    @abstractmethod
+    def increment(self, name, method_name):
+        """
+        Increments a counter by one.
+        :param name: Counter name
+        :param method_name: API method name
+        """
+        pass
+
+    @abstractmethod
+    def add_in_flight(self, delta):
+        """
+        Changes the number of requests in flight.
+        :param delta: 1 when a request starts, -1 when it finishes
+        """
+        pass
+
+
+class PrometheusMetrics(MetricsSink):
+    """
+    Keeps measurements in memory and renders them in the Prometheus text exposition format.
+
+    Example with aiohttp:
+
+    metrics = PrometheusMetrics()
+    bot = AioTGram(token, session=RequestSession(metrics=metrics))
+
+    async def handle_metrics(request):
+        return web.Response(text=metrics.render(), content_type='text/plain')
+    """
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='aiotgram_'):
+        """
+        :param buckets: Sorted upper bounds of histogram buckets in seconds
+        :param prefix: Prefix of metric names
+        """
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.in_flight = 0
+
+        # {name: {method_name: [bucket counts..., +Inf count, sum]}}
+        self._histograms = defaultdict(dict)
+        # {name: {method_name: count}}
+        self._counters = defaultdict(lambda: defaultdict(int))
+
+    def observe(self, name, method_name, value):
+        histogram = self._histograms[name].get(method_name)
+        if histogram is None:
+            histogram = self._histograms[name][method_name] = [0] * (len(self.buckets) + 2)
+
+        # Counts are kept per bucket and summed up on render.
+        histogram[bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    def increment(self, name, method_name):
+        self._counters[name][method_name] += 1
+
+    def add_in_flight(self, delta):
+        self.in_flight += delta
+
+    def render(self):
+        """
+        Returns all metrics in the Prometheus text format.
+        """
+        lines = []
+
+        for name, methods in sorted(self._histograms.items()):
+            metric = self.prefix + name
+            lines.append('# TYPE {0} histogram'.format(metric))
+            for method_name, histogram in sorted(methods.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram):
+                    cumulative += count
+                    lines.append('{0}_bucket{{method="{1}",le="{2}"}} {3}'.format(
+                        metric, method_name, bound, cumulative))
+
+                cumulative += histogram[-2]
+                lines.append('{0}_bucket{{method="{1}",le="+Inf"}} {2}'.format(metric, method_name, cumulative))
+                lines.append('{0}_sum{{method="{1}"}} {2}'.format(metric, method_name, histogram[-1]))
+                lines.append('{0}_count{{method="{1}"}} {2}'.format(metric, method_name, cumulative))
+
+        for name, methods in sorted(self._counters.items()):
+            metric = '{0}{1}_total'.format(self.prefix, name)
+            lines.append('# TYPE {0} counter'.format(metric))
+            for method_name, count in sorted(methods.items()):
+                lines.append('{0}{{method="{1}"}} {2}'.format(metric, method_name, count))
+
+        metric = self.prefix + 'in_flight'
+        lines.append('# TYPE {0} gauge'.format(metric))
+        lines.append('{0} {1}'.format(metric, self.in_flight))
+
+        return '\n'.join(lines) + '\n'
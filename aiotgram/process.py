@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains running of message handlers in a process pool, see message_handler(executor='process').
+
+A handler running in another process gets a MessageSlice instead of the Message and can not call the bot,
+it returns ApiCall objects which are made by the bot in the event loop after the handler finishes.
+
+Example:
+
+# The handler must be defined at module level to be picklable.
+def render_report(message):
+    return [ApiCall('send_document', message.chat_id, render_chart(message.text), caption='Report')]
+
+bot.message_handler(commands=['report'], executor='process')(render_report)
+
+Classes:
+- MessageSlice
+- ApiCall
+"""
+
+import asyncio
+
+from collections import namedtuple
+
+
+_MESSAGE_SLICE_FIELDS = ('message_id', 'date', 'chat_id', 'chat_type', 'from_user_id', 'content_type', 'text',
+                         'caption', 'reply_to_message_id')
+
+
+class MessageSlice(namedtuple('MessageSlice', _MESSAGE_SLICE_FIELDS)):
+    """
+    Fields of a Message which are sent to a handler running in the process pool.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_message(cls, message):
+        reply_to_message = getattr(message, 'reply_to_message', None)
+        from_user = getattr(message, 'from_user', None)
+
+        return cls(
+            message_id=message.message_id,
+            date=message.date,
+            chat_id=message.chat.id,
+            chat_type=message.chat.type,
+            from_user_id=from_user.id if from_user is not None else None,
+            content_type=message.content_type,
+            text=message.text,
+            caption=getattr(message, 'caption', None),
+            reply_to_message_id=reply_to_message.message_id if reply_to_message is not None else None,
+        )
+
+
+class ApiCall:
+    """
+    Call of a bot method returned by a handler running in the process pool.
+    """
+
+    __slots__ = ('method_name', 'args', 'kwargs')
+
+    def __init__(self, method_name, *args, **kwargs):
+        """
+        :param method_name: Name of an AioTGram method, e.g. 'send_message'
+        :param args: Picklable arguments of the method
+        :param kwargs: Picklable keyword arguments of the method
+        """
+        self.method_name = method_name
+        self.args = args
+        self.kwargs = kwargs
+
+    def __getstate__(self):
+        return self.method_name, self.args, self.kwargs
+
+    def __setstate__(self, state):
+        self.method_name, self.args, self.kwargs = state
+
+    def __repr__(self):
+        return 'ApiCall({0!r}, *{1!r}, **{2!r})'.format(self.method_name, self.args, self.kwargs)
+
+    async def execute(self, bot):
+        method = getattr(bot, self.method_name, None) if not self.method_name.startswith('_') else None
+        if method is None or not asyncio.iscoroutinefunction(method):
+            raise ValueError('{0!r} is not a method of the bot'.format(self.method_name))
+
+        return await method(*self.args, **self.kwargs)
+
+
+def run_handler(function, message):
+    """
+    Calls the handler in a worker process.
+    :return: list of ApiCall
+    """
+    calls = function(message)
+
+    if calls is None:
+        return []
+    if isinstance(calls, ApiCall):
+        return [calls]
+
+    return list(calls)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains the outbound scheduler which keeps requests within the Telegram Bot API quotas.
+
+Classes:
+- TokenBucket
+- RateLimiter
+"""
+
+import time
+import asyncio
+
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """
+    Token bucket which hands out reservations instead of blocking.
+
+    Every call of reserve takes one token, the balance may become negative, in that case the returned
+    delay is the time the caller has to wait for its token. Since reservations are made in call order,
+    waiting callers are served first come, first served.
+    """
+
+    def __init__(self, rate, capacity=1):
+        """
+        :param rate: Tokens added per second.
+        :param capacity: Maximum number of tokens, i.e. the allowed burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0
+
+    def reserve(self):
+        """
+        Takes one token.
+        :return: Seconds to wait before the token may be used.
+        """
+        now = self._refill()
+        self._tokens -= 1
+
+        delay = 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+        return max(delay, self._blocked_until - now)
+
+    def block(self, delay):
+        """
+        Forbids using tokens for `delay` seconds, e.g. after the server answered with retry_after.
+        :param delay: Seconds
+        """
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+    def is_idle(self):
+        """
+        Checks whether the bucket is full again, such bucket can be dropped without losing any state.
+        """
+        now = self._refill()
+        return self._tokens >= self.capacity and self._blocked_until <= now
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+        return now
+
+
+class RateLimiter:
+    """
+    Schedules outbound requests according to the Telegram limits:
+        - about 30 messages per second for the bot overall,
+        - 1 message per second to the same private chat,
+        - 20 messages per minute to the same group or channel.
+    See https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+
+    Buckets are kept per bot token, so one limiter can be shared by several bots.
+    """
+
+    def __init__(self, global_rate=30, private_chat_rate=1, group_chat_rate=20 / 60, group_chat_burst=1):
+        """
+        :param global_rate: Messages per second for one bot.
+        :param private_chat_rate: Messages per second to one private chat.
+        :param group_chat_rate: Messages per second to one group or channel.
+        :param group_chat_burst: Number of messages which may be sent to one group without waiting.
+        """
+        self.global_rate = global_rate
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.group_chat_burst = group_chat_burst
+
+        self._global_buckets = {}
+        self._chat_buckets = OrderedDict()
+
+    async def acquire(self, token, chat_id=None):
+        """
+        Waits until a request of the bot to chat_id fits into the quotas.
+        :param token: Bot token
+        :param chat_id: Target chat, None if the request is not addressed to a chat.
+        """
+        if chat_id is not None:
+            delay = self._get_chat_bucket(token, chat_id).reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        delay = self._get_global_bucket(token).reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def retry_after(self, token, chat_id, delay):
+        """
+        Holds back requests after the server answered with code 429 and parameters.retry_after.
+        :param token: Bot token
+        :param chat_id: Chat the rejected request was addressed to, None blocks the whole bot.
+        :param delay: Value of retry_after in seconds
+        """
+        if chat_id is None:
+            self._get_global_bucket(token).block(delay)
+        else:
+            self._get_chat_bucket(token, chat_id).block(delay)
+
+    def _get_global_bucket(self, token):
+        bucket = self._global_buckets.get(token)
+        if bucket is None:
+            bucket = self._global_buckets[token] = TokenBucket(self.global_rate, self.global_rate)
+
+        return bucket
+
+    def _get_chat_bucket(self, token, chat_id):
+        key = (token, chat_id)
+        bucket = self._chat_buckets.get(key)
+
+        if bucket is None:
+            if self._is_private_chat(chat_id):
+                bucket = TokenBucket(self.private_chat_rate)
+            else:
+                bucket = TokenBucket(self.group_chat_rate, self.group_chat_burst)
+            self._chat_buckets[key] = bucket
+        else:
+            self._chat_buckets.move_to_end(key)
+
+        self._drop_idle_buckets()
+
+        return bucket
+
+    def _drop_idle_buckets(self):
+        # Buckets are ordered by last use, so only the oldest ones have to be checked.
+        while len(self._chat_buckets) > 1:
+            key, bucket = next(iter(self._chat_buckets.items()))
+            if not bucket.is_idle():
+                break
+            del self._chat_buckets[key]
+
+    @staticmethod
+    def _is_private_chat(chat_id):
+        # Ids of private chats are positive, groups and channels have negative ids or @username.
+        try:
+            return int(chat_id) > 0
+        except (TypeError, ValueError):
+            return False
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains the cache of read-only API calls (getMe, getChat, getChatMember, getChatAdministrators).
+
+Classes:
+- ReadCache
+"""
+
+import time
+import asyncio
+import functools
+
+from collections import OrderedDict, defaultdict
+
+
+class ReadCache:
+    """
+    Bounded TTL cache with collapsing of concurrent identical calls.
+
+    While a call is in flight, identical calls wait for its result instead of sending their own requests.
+    Results are kept for `ttl` seconds, the least recently used ones are dropped when there are more than
+    `max_size` of them. Results are grouped by chat, so a change in a chat drops all of them at once.
+    """
+
+    def __init__(self, ttl=60, max_size=10000):
+        """
+        :param ttl: Seconds a result is kept
+        :param max_size: Maximum number of kept results
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # {key: (expires_at, chat_key, result)}
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._chat_keys = defaultdict(set)
+
+    async def get(self, key, fetch, token=None, chat_id=None):
+        """
+        Returns cached result of key or awaits fetch and caches its result.
+        :param key: Hashable identifier of the call
+        :param fetch: Coroutine function making the call
+        :param token: Bot token, used with chat_id for invalidation
+        :param chat_id: Chat the call is about, None if it is not about a chat
+        :return:
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry[2]
+            self._remove(key)
+
+        task = self._in_flight.get(key)
+        if task is None:
+            chat_key = self._get_chat_key(token, chat_id) if chat_id is not None else None
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            if chat_key is not None:
+                self._chat_keys[chat_key].add(key)
+            task.add_done_callback(functools.partial(self._store, key, chat_key))
+
+        # Cancellation of one caller must not cancel the call the others are waiting for.
+        return await asyncio.shield(task)
+
+    def invalidate_chat(self, token, chat_id):
+        """
+        Drops all results about the chat, calls in flight are not cached when they finish.
+        """
+        for key in self._chat_keys.pop(self._get_chat_key(token, chat_id), ()):
+            self._entries.pop(key, None)
+            self._in_flight.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._in_flight.clear()
+        self._chat_keys.clear()
+
+    def _store(self, key, chat_key, task):
+        # The call was invalidated while it was in flight, its result may be outdated.
+        if self._in_flight.get(key) is not task:
+            return
+        del self._in_flight[key]
+
+        if task.cancelled() or task.exception() is not None:
+            self._unindex(key, chat_key)
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, chat_key, task.result())
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, chat_key, _ = self._entries.pop(key)
+        if key not in self._in_flight:
+            self._unindex(key, chat_key)
+
+    def _unindex(self, key, chat_key):
+        keys = self._chat_keys.get(chat_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._chat_keys[chat_key]
+
+    @staticmethod
+    def _get_chat_key(token, chat_id):
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+
+        return token, chat_id
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains policies for failed requests to the Telegram Bot API.
+
+Classes:
+- RetryPolicy
+- CircuitBreaker
+"""
+
+import time
+import random
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, limited by the number of attempts and the total time.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30, deadline=60, jitter=True):
+        """
+        :param max_attempts: Maximum number of attempts including the first one, None means no limit.
+        :param base_delay: Delay before the first retry in seconds, it is doubled for every next retry.
+        :param max_delay: Upper bound of a single delay in seconds.
+        :param deadline: Seconds after the first attempt when no more retries are made, None means no limit.
+        :param jitter: Pick a random delay between 0 and the backoff value to spread retries of many requests.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.jitter = jitter
+
+    def get_delay(self, attempt):
+        """
+        Returns delay before the next attempt.
+        :param attempt: Number of the failed attempt, starting from 1.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        return delay
+
+    def can_retry(self, attempt, elapsed):
+        """
+        Checks whether another attempt is allowed.
+        :param attempt: Number of the failed attempt, starting from 1.
+        :param elapsed: Seconds since the first attempt including the upcoming delay.
+        """
+        if self.max_attempts is not None and attempt >= self.max_attempts:
+            return False
+        if self.deadline is not None and elapsed > self.deadline:
+            return False
+
+        return True
+
+
+class CircuitBreaker:
+    """
+    Fails requests fast while an endpoint is down.
+
+    After failure_threshold consecutive failures the endpoint is considered down for recovery_timeout
+    seconds and requests to it are rejected without touching the network. After that one trial request
+    is let through, its success closes the breaker and its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        """
+        :param failure_threshold: Number of consecutive failures which opens the breaker.
+        :param recovery_timeout: Seconds the breaker stays open before a trial request.
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._failures = {}
+        self._opened_at = {}
+
+    def allow(self, endpoint):
+        opened_at = self._opened_at.get(endpoint)
+        if opened_at is None:
+            return True
+
+        now = time.monotonic()
+        if now - opened_at >= self.recovery_timeout:
+            # Half-open: let this request through and keep rejecting the others until it finishes.
+            self._opened_at[endpoint] = now
+            return True
+
+        return False
+
+    def is_open(self, endpoint):
+        return endpoint in self._opened_at
+
+    def record_success(self, endpoint):
+        self._failures.pop(endpoint, None)
+        self._opened_at.pop(endpoint, None)
+
+    def record_failure(self, endpoint):
+        failures = self._failures.get(endpoint, 0) + 1
+        self._failures[endpoint] = failures
+
+        if failures >= self.failure_threshold:
+            self._opened_at[endpoint] = time.monotonic()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains the pooled HTTP session used for requests to the Telegram Bot API.
+
+Classes:
+- RequestSession
+"""
+
+import asyncio
+
+import aiohttp
+
+from aiotgram.retry import RetryPolicy
+
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+
+
+class RequestSession:
+    """
+    Pooled HTTP session which is used by apihelper for all requests of one (or several) bots.
+
+    The underlying aiohttp.ClientSession is created lazily inside the running event loop and
+    is recreated if it was closed. DNS lookups are cached by the connector and resolved through
+    aiodns when it is installed.
+    """
+
+    def __init__(self, limit=100, limit_per_host=0, keepalive_timeout=30, ttl_dns_cache=300,
+                 read_timeout=5, connect_timeout=None, resolver=None, rate_limiter=None,
+                 retry_policy=None, circuit_breaker=None, max_downloads=10, metrics=None, read_cache=None):
+        """
+        :param limit: Total number of simultaneous connections, 0 means no limit.
+        :param limit_per_host: Number of simultaneous connections to one host, 0 means no limit.
+        :param keepalive_timeout: Seconds an idle connection is kept open for reuse.
+        :param ttl_dns_cache: Seconds a resolved host is cached, None caches forever.
+        :param read_timeout: Timeout of reading a portion of data from the server.
+        :param connect_timeout: Timeout of acquiring a connection from the pool or establishing a new one.
+        :param resolver: Optional aiohttp resolver, aiohttp.AsyncResolver is used if aiodns is installed.
+        :param rate_limiter: Optional RateLimiter which delays sending of messages to stay within the API quotas.
+        :param retry_policy: RetryPolicy for failed requests, RetryPolicy with defaults is used if not passed.
+        :param circuit_breaker: Optional CircuitBreaker which fails requests fast while the API server is down.
+        :param max_downloads: Maximum number of simultaneous file downloads.
+        :param metrics: Optional MetricsSink receiving latency and error measurements of requests.
+        :param read_cache: Optional ReadCache for getMe, getChat, getChatMember and getChatAdministrators.
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.read_timeout = read_timeout
+        self.connect_timeout = connect_timeout
+        self.resolver = resolver
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+
+        self.retry_policy = retry_policy
+        if not self.retry_policy:
+            self.retry_policy = RetryPolicy()
+
+        self.max_downloads = max_downloads
+        self.metrics = metrics
+        self.read_cache = read_cache
+
+        self._session = None
+        self._download_semaphore = None
+
+    @property
+    def closed(self):
+        return self._session is None or self._session.closed
+
+    async def get_session(self):
+        """
+        Returns opened aiohttp.ClientSession, creates it on the first call.
+        :return:
+        """
+        if self.closed:
+            self._session = aiohttp.ClientSession(
+                connector=self._make_connector(),
+                timeout=aiohttp.ClientTimeout(sock_read=self.read_timeout, sock_connect=self.connect_timeout)
+            )
+
+        return self._session
+
+    def get_download_semaphore(self):
+        if self._download_semaphore is None:
+            self._download_semaphore = asyncio.Semaphore(self.max_downloads)
+
+        return self._download_semaphore
+
+    async def close(self):
+        """
+        Closes the underlying session and all pooled connections.
+        :return:
+        """
+        if not self.closed:
+            await self._session.close()
+
+        self._session = None
+
+    def _make_connector(self):
+        resolver = self.resolver
+        if resolver is None and aiodns is not None:
+            resolver = aiohttp.AsyncResolver()
+
+        return aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.ttl_dns_cache,
+            resolver=resolver
+        )
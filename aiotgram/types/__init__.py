@@ -3,10 +3,13 @@ from .base import JsonSerializable, JsonDeserializable
 
 from .update import Update
 
-from .ext import Message, Chat, Poll
+from .ext import Message, Chat, Poll, CallbackQuery
 from .common import WebhookInfo, User, UserProfilePhotos
 from .primary import File
 
 from .chat import ChatMember
 from .games import GameHighScore
 from .stickers import StickerSet
+from .inlinequery import InlineQuery, ChosenInlineResult
+from .payments import ShippingQuery, PreCheckoutQuery
+from .poll import PollAnswer
@@ -9,10 +9,7 @@ Classes:
 - JsonDeserializable
 """
 
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aiotgram import codec
 
 from abc import ABCMeta, abstractmethod
 
@@ -47,17 +44,17 @@ class JsonDeserializable(metaclass=ABCMeta):
     @staticmethod
     def check_json(json_type):
         """
-        Checks whether json_type is a dict or a string. If it is already a dict, it is returned as-is.
-        If it is not, it is converted to a dict by means of json.loads(json_type)
+        Checks whether json_type is a dict, a string or bytes. If it is already a dict, it is returned as-is.
+        If it is not, it is converted to a dict by means of codec.loads(json_type)
         :param json_type:
         :return:
         """
         if isinstance(json_type, dict):
             return json_type
-        elif isinstance(json_type, str):
-            return json.loads(json_type)
+        elif isinstance(json_type, (str, bytes)):
+            return codec.loads(json_type)
         else:
-            raise ValueError("json_type should be a json dict or string.")
+            raise ValueError("json_type should be a json dict, string or bytes.")
 
     def __str__(self):
         dict_ = {}
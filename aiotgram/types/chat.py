@@ -9,10 +9,7 @@ Types:
 - ChatPermissions
 """
 
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aiotgram import codec
 
 from .base import JsonDeserializable, Dictionaryable, JsonSerializable
 from .common import User
@@ -148,7 +145,7 @@ class ChatPermissions(JsonDeserializable, JsonSerializable, Dictionaryable):
             can_change_info, can_invite_users, can_pin_messages)
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         json_dict = dict()
@@ -16,10 +16,7 @@ Types:
 
 import asyncio
 
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aiotgram import codec
 
 from .base import JsonDeserializable, Dictionaryable, JsonSerializable
 
@@ -86,7 +83,7 @@ class User(JsonDeserializable, Dictionaryable, JsonSerializable):
         self.supports_inline_queries = supports_inline_queries
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         return {'id': self.id,
@@ -173,7 +170,7 @@ class ForceReply(JsonSerializable):
         json_dict = {'force_reply': True}
         if self.selective:
             json_dict['selective'] = True
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class LoginUrl(Dictionaryable, JsonSerializable):
@@ -184,7 +181,7 @@ class LoginUrl(Dictionaryable, JsonSerializable):
         self.request_write_access = request_write_access
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         json_dict = {'url': self.url}
@@ -210,7 +207,7 @@ class BotCommand(JsonSerializable):
         self.description = description
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         return {'command': self.command, 'description': self.description}
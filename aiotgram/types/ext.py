@@ -9,11 +9,6 @@ Types:
 - Poll
 """
 
-try:
-    import ujson as json
-except ImportError:
-    import json
-
 from .base import JsonDeserializable
 
 from .common import User, PhotoSize, MessageEntity
@@ -149,7 +144,7 @@ class Message(JsonDeserializable):
         if 'caption' in obj:
             opts['caption'] = obj['caption']
         if 'contact' in obj:
-            opts['contact'] = Contact.de_json(json.dumps(obj['contact']))
+            opts['contact'] = Contact.de_json(obj['contact'])
             content_type = 'contact'
         if 'location' in obj:
             opts['location'] = Location.de_json(obj['location'])
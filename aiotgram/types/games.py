@@ -10,10 +10,7 @@ Types:
 - GameHighScore
 """
 
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aiotgram import codec
 
 from .base import JsonSerializable, JsonDeserializable
 from .common import User, PhotoSize, MessageEntity
@@ -30,7 +27,7 @@ class InlineQueryResultGame(JsonSerializable):
         json_dic = {'type': self.type, 'id': self.id, 'game_short_name': self.game_short_name}
         if self.reply_markup:
             json_dic['reply_markup'] = self.reply_markup.to_dict()
-        return json.dumps(json_dic)
+        return codec.dumps(json_dic)
 
 
 class Game(JsonDeserializable):
@@ -32,10 +32,7 @@ Types:
 - InlineQueryResultCachedAudio
 """
 
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aiotgram import codec
 
 from .base import JsonDeserializable, Dictionaryable, JsonSerializable
 from .common import User
@@ -219,7 +216,7 @@ class InlineQueryResultArticle(JsonSerializable):
         if self.thumb_height:
             json_dict['thumb_height'] = self.thumb_height
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultPhoto(JsonSerializable):
@@ -274,7 +271,7 @@ class InlineQueryResultPhoto(JsonSerializable):
         if self.input_message_content:
             json_dict['input_message_content'] = self.input_message_content.to_dict()
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultGif(JsonSerializable):
@@ -322,7 +319,7 @@ class InlineQueryResultGif(JsonSerializable):
         if self.gif_duration:
             json_dict['gif_duration'] = self.gif_duration
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultMpeg4Gif(JsonSerializable):
@@ -376,7 +373,7 @@ class InlineQueryResultMpeg4Gif(JsonSerializable):
         if self.mpeg4_duration:
             json_dict['mpeg4_duration '] = self.mpeg4_duration
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultVideo(JsonSerializable):
@@ -434,7 +431,7 @@ class InlineQueryResultVideo(JsonSerializable):
         if self.input_message_content:
             json_dict['input_message_content'] = self.input_message_content.to_dict()
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultAudio(JsonSerializable):
@@ -467,7 +464,7 @@ class InlineQueryResultAudio(JsonSerializable):
         if self.input_message_content:
             json_dict['input_message_content'] = self.input_message_content.to_dict()
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultVoice(JsonSerializable):
@@ -500,7 +497,7 @@ class InlineQueryResultVoice(JsonSerializable):
         if self.input_message_content:
             json_dict['input_message_content'] = self.input_message_content.to_dict()
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultDocument(JsonSerializable):
@@ -541,7 +538,7 @@ class InlineQueryResultDocument(JsonSerializable):
         if self.input_message_content:
             json_dict['input_message_content'] = self.input_message_content.to_dict()
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultLocation(JsonSerializable):
@@ -576,7 +573,7 @@ class InlineQueryResultLocation(JsonSerializable):
         if self.input_message_content:
             json_dict['input_message_content'] = self.input_message_content.to_dict()
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultVenue(JsonSerializable):
@@ -612,7 +609,7 @@ class InlineQueryResultVenue(JsonSerializable):
         if self.input_message_content:
             json_dict['input_message_content'] = self.input_message_content.to_dict()
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultContact(JsonSerializable):
@@ -645,7 +642,7 @@ class InlineQueryResultContact(JsonSerializable):
         if self.input_message_content:
             json_dict['input_message_content'] = self.input_message_content.to_dict()
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class BaseInlineQueryResultCached(JsonSerializable):
@@ -678,7 +675,7 @@ class BaseInlineQueryResultCached(JsonSerializable):
         if self.parse_mode:
             json_dict['parse_mode'] = self.parse_mode
 
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
 class InlineQueryResultCachedPhoto(BaseInlineQueryResultCached):
@@ -12,12 +12,7 @@ Types:
 - InputMediaDocument
 """
 
-try:
-    import ujson as json
-except ImportError:
-    import json
-
-from aiotgram import util
+from aiotgram import codec, util
 
 from .base import JsonSerializable, Dictionaryable
 
@@ -25,13 +20,19 @@ from .base import JsonSerializable, Dictionaryable
 class InputMedia(Dictionaryable, JsonSerializable):
     def __init__(self, type, media, caption=None, parse_mode=None):
         self.type = type
-        self.media = media
         self.caption = caption
         self.parse_mode = parse_mode
 
-        media_is_str = util.is_string(self.media)
+        self.set_media(media)
 
-        if media_is_str:
+    def set_media(self, media):
+        """
+        Replaces media, e.g. with file_id of the same file uploaded before.
+        :param media: file_id or URL string, or file to upload
+        """
+        self.media = media
+
+        if util.is_string(self.media):
             self._media_name = ''
             self._media_dic = self.media
         else:
@@ -39,7 +40,7 @@ class InputMedia(Dictionaryable, JsonSerializable):
             self._media_dic = 'attach://{0}'.format(self._media_name)
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         json_dict = {'type': self.type, 'media': self._media_dic}
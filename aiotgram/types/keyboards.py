@@ -14,16 +14,50 @@ Types:
 
 import asyncio
 
-try:
-    import ujson as json
-except ImportError:
-    import json
-
-from aiotgram import util
+from aiotgram import codec, util
 
 from .base import Dictionaryable, JsonSerializable
 
 
+class _CachedJson:
+    """
+    Keeps the result of to_json until the keyboard is changed.
+
+    After freeze the keyboard can not be changed anymore and to_json always returns the same string,
+    which is useful for keyboards sent with many messages.
+    """
+
+    _json = None
+    _frozen = False
+
+    def __setattr__(self, key, value):
+        if self._frozen:
+            raise AttributeError('Keyboard is frozen and can not be changed')
+
+        self.__dict__['_json'] = None
+        self.__dict__[key] = value
+
+    def freeze(self):
+        """
+        Serializes the keyboard once and forbids further changes.
+        :return: self, to allow function chaining.
+        """
+        if self._frozen:
+            return self
+
+        self.keyboard = tuple(tuple(row) for row in self.keyboard)
+        self.__dict__['_json'] = self.to_json()
+        self.__dict__['_frozen'] = True
+
+        return self
+
+    def _invalidate(self):
+        if self._frozen:
+            raise AttributeError('Keyboard is frozen and can not be changed')
+
+        self.__dict__['_json'] = None
+
+
 class ReplyKeyboardRemove(JsonSerializable):
     def __init__(self, selective=None):
         self.selective = selective
@@ -32,10 +66,10 @@ class ReplyKeyboardRemove(JsonSerializable):
         json_dict = {'remove_keyboard': True}
         if self.selective:
             json_dict['selective'] = True
-        return json.dumps(json_dict)
+        return codec.dumps(json_dict)
 
 
-class ReplyKeyboardMarkup(JsonSerializable):
+class ReplyKeyboardMarkup(_CachedJson, JsonSerializable):
     def __init__(self, resize_keyboard=None, one_time_keyboard=None, selective=None, row_width=3):
         self.resize_keyboard = resize_keyboard
         self.one_time_keyboard = one_time_keyboard
@@ -52,6 +86,8 @@ class ReplyKeyboardMarkup(JsonSerializable):
         See https://core.telegram.org/bots/api#replykeyboardmarkup
         :param args: KeyboardButton to append to the keyboard
         """
+        self._invalidate()
+
         i = 1
         row = []
         for button in args:
@@ -76,6 +112,8 @@ class ReplyKeyboardMarkup(JsonSerializable):
         :param args: strings
         :return: self, to allow function chaining.
         """
+        self._invalidate()
+
         btn_array = []
         for button in args:
             if util.is_string(button):
@@ -91,6 +129,9 @@ class ReplyKeyboardMarkup(JsonSerializable):
         https://core.telegram.org/bots/api#replykeyboardmarkup
         :return:
         """
+        if self._json is not None:
+            return self._json
+
         json_dict = {'keyboard': self.keyboard}
         if self.one_time_keyboard:
             json_dict['one_time_keyboard'] = True
@@ -98,7 +139,9 @@ class ReplyKeyboardMarkup(JsonSerializable):
             json_dict['resize_keyboard'] = True
         if self.selective:
             json_dict['selective'] = True
-        return json.dumps(json_dict)
+
+        self.__dict__['_json'] = codec.dumps(json_dict)
+        return self._json
 
 
 class KeyboardButton(Dictionaryable, JsonSerializable):
@@ -109,7 +152,7 @@ class KeyboardButton(Dictionaryable, JsonSerializable):
         self.request_poll = request_poll
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         json_dict = {'text': self.text}
@@ -130,7 +173,7 @@ class KeyboardButtonPollType(Dictionaryable):
         return {'type': self.type}
 
 
-class InlineKeyboardMarkup(Dictionaryable, JsonSerializable):
+class InlineKeyboardMarkup(_CachedJson, Dictionaryable, JsonSerializable):
     def __init__(self, row_width=3):
         """
         This object represents an inline keyboard that appears
@@ -151,6 +194,8 @@ class InlineKeyboardMarkup(Dictionaryable, JsonSerializable):
         See https://core.telegram.org/bots/api#inlinekeyboardmarkup
         :param args: Array of InlineKeyboardButton to append to the keyboard
         """
+        self._invalidate()
+
         i = 1
         row = []
         for button in args:
@@ -172,8 +217,9 @@ class InlineKeyboardMarkup(Dictionaryable, JsonSerializable):
         :param args: Array of InlineKeyboardButton to append to the keyboard
         :return: self, to allow function chaining.
         """
-        for button in args:
-            self.keyboard.append(button.to_dict())
+        self._invalidate()
+
+        self.keyboard.append([button.to_dict() for button in args])
 
         return self
 
@@ -184,7 +230,10 @@ class InlineKeyboardMarkup(Dictionaryable, JsonSerializable):
         https://core.telegram.org/bots/api#inlinekeyboardmarkup
         :return:
         """
-        return json.dumps(self.to_dict())
+        if self._json is None:
+            self.__dict__['_json'] = codec.dumps(self.to_dict())
+
+        return self._json
 
     def to_dict(self):
         json_dict = {'inline_keyboard': self.keyboard}
@@ -204,7 +253,7 @@ class InlineKeyboardButton(Dictionaryable, JsonSerializable):
         self.login_url = login_url
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         json_dict = {'text': self.text}
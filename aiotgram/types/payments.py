@@ -14,10 +14,7 @@ Types:
 - PreCheckoutQuery
 """
 
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aiotgram import codec
 
 from .base import JsonSerializable, JsonDeserializable
 from .common import User
@@ -29,7 +26,7 @@ class LabeledPrice(JsonSerializable):
         self.amount = amount
 
     def to_json(self):
-        return json.dumps({
+        return codec.dumps({
             'label': self.label, 'amount': self.amount
         })
 
@@ -122,7 +119,7 @@ class ShippingOption(JsonSerializable):
         price_list = []
         for price in self.prices:
             price_list.append(price.to_dict())
-        json_dict = json.dumps({'id': self.id, 'title': self.title, 'prices': price_list})
+        json_dict = codec.dumps({'id': self.id, 'title': self.title, 'prices': price_list})
         return json_dict
 
 
@@ -8,10 +8,7 @@ Types:
 - PollAnswer
 """
 
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aiotgram import codec
 
 from .base import JsonSerializable, JsonDeserializable, Dictionaryable
 from .common import User
@@ -35,7 +32,7 @@ class PollOption(JsonSerializable, JsonDeserializable):
 
     def to_json(self):
         # send_poll Option is a simple string: https://core.telegram.org/bots/api#sendpoll
-        return json.dumps(self.text)
+        return codec.dumps(self.text)
 
 
 class PollAnswer(JsonSerializable, JsonDeserializable, Dictionaryable):
@@ -57,7 +54,7 @@ class PollAnswer(JsonSerializable, JsonDeserializable, Dictionaryable):
         self.options_ids = options_ids
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         return {'poll_id': self.poll_id,
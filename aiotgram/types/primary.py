@@ -14,10 +14,7 @@ Types:
 - Venue
 - File
 """
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aiotgram import codec
 
 from .base import JsonDeserializable, Dictionaryable, JsonSerializable
 from .common import PhotoSize
@@ -40,7 +37,7 @@ class Dice(JsonSerializable, Dictionaryable, JsonDeserializable):
         self.emoji = emoji
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         return {'value': self.value,
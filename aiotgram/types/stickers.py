@@ -9,10 +9,7 @@ Types:
 - MaskPosition
 """
 
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aiotgram import codec
 
 from .base import JsonSerializable, JsonDeserializable, Dictionaryable
 from .common import PhotoSize
@@ -96,7 +93,7 @@ class MaskPosition(Dictionaryable, JsonDeserializable, JsonSerializable):
         self.scale = scale
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
 
     def to_dict(self):
         return {'point': self.point, 'x_shift': self.x_shift, 'y_shift': self.y_shift, 'scale': self.scale}
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains replying to an update in the body of the webhook response.
+
+Telegram allows to return one API method call in the response to a webhook request, which saves
+an outbound request. The result of such a call is not known to the bot.
+See https://core.telegram.org/bots/api#making-requests-when-getting-updates
+
+Classes:
+- WebhookReply
+"""
+
+import asyncio
+import contextvars
+
+from aiotgram import codec
+
+
+# Methods which may be returned in the webhook response, their results are not needed by the callers.
+REPLY_METHODS = {'sendMessage', 'answerCallbackQuery'}
+
+# WebhookReply of the update being processed, handler tasks inherit it from the dispatcher.
+current_reply = contextvars.ContextVar('current_reply', default=None)
+
+
+class WebhookReply:
+    """
+    Slot for one API call of a bot which is returned in the webhook response.
+    """
+
+    def __init__(self, token):
+        """
+        :param token: Token of the bot which received the update
+        """
+        self.token = token
+        self.payload = None
+        self.closed = False
+
+        self._claimed = asyncio.Event()
+        self._tasks = []
+
+    def claim(self, token, method_name, params):
+        """
+        Takes the slot for the call if it is still free.
+        :return: True if the call will be sent in the webhook response
+        """
+        if self.closed or self.payload is not None or token != self.token or method_name not in REPLY_METHODS:
+            return False
+
+        self.payload = dict(params or {}, method=method_name)
+        if 'reply_markup' in self.payload and isinstance(self.payload['reply_markup'], str):
+            self.payload['reply_markup'] = codec.loads(self.payload['reply_markup'])
+
+        self._claimed.set()
+
+        return True
+
+    def add_task(self, task):
+        self._tasks.append(task)
+
+    async def wait(self, timeout):
+        """
+        Waits until the slot is taken, all handlers of the update finish or timeout expires.
+        Calls made after that are sent as usual requests.
+        :param timeout: Seconds
+        :return: body of the webhook response, None if no call was claimed
+        """
+        if self._tasks and self.payload is None:
+            loop = asyncio.get_event_loop()
+            deadline = loop.time() + timeout
+            claimed = asyncio.ensure_future(self._claimed.wait())
+
+            # Tasks may start more tasks of the update, e.g. a coroutine middleware starts the handlers.
+            waited = 0
+            while self.payload is None and waited < len(self._tasks):
+                tasks, waited = self._tasks[waited:], len(self._tasks)
+                # asyncio.wait does not cancel the handlers when it is cancelled itself.
+                handlers = asyncio.ensure_future(asyncio.wait(tasks))
+
+                done, _ = await asyncio.wait([claimed, handlers], timeout=max(deadline - loop.time(), 0),
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                handlers.cancel()
+                if handlers not in done:
+                    break
+
+            claimed.cancel()
+
+        self.closed = True
+        self._tasks = []
+
+        return self.payload
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module contains the pool which runs handler tasks.
+
+Classes:
+- HandlerPool
+"""
+
+import asyncio
+import logging
+
+
+logger = logging.getLogger('AioTGram')
+
+
+class HandlerPool:
+    """
+    Runs handlers with a limited concurrency and keeps references to their tasks.
+
+    At most `max_workers` handlers run at once, the others wait in the queue. When `max_queue` handlers are
+    waiting, polling and process_webhook_update wait before taking new updates, so a burst of updates is
+    held back by Telegram instead of piling up in memory. Updates are taken by batches, so the queue may exceed
+    max_queue by the handlers of one batch. Exceptions of handlers are logged.
+
+    Example:
+
+    bot = AioTGram(token, handler_pool=HandlerPool(max_workers=100, max_queue=1000))
+    """
+
+    def __init__(self, max_workers=None, max_queue=None):
+        """
+        :param max_workers: Maximum number of handlers running at once, None for no limit
+        :param max_queue: Maximum number of waiting handlers before the intake of updates pauses, None for no limit
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        self.running = 0
+
+        self._tasks = set()
+        # Created on first use to be bound to the running loop.
+        self._semaphore = None
+        self._space = None
+
+    @property
+    def queue_depth(self):
+        """
+        Returns the number of handlers waiting for a worker.
+        """
+        return len(self._tasks) - self.running
+
+    def __len__(self):
+        """
+        Returns the number of handlers running or waiting.
+        """
+        return len(self._tasks)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Calls the coroutine function when a worker is free.
+        """
+        if self.max_workers is None:
+            return await self._call(function, *args, **kwargs)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        async with self._semaphore:
+            return await self._call(function, *args, **kwargs)
+
+    def add_task(self, task):
+        """
+        Keeps a reference to the task of run until it finishes.
+        """
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    async def wait_for_space(self):
+        """
+        Waits until fewer than max_queue handlers are waiting.
+        """
+        if self.max_queue is None:
+            return
+
+        while self.queue_depth >= self.max_queue:
+            if self._space is None:
+                self._space = asyncio.Event()
+            self._space.clear()
+            await self._space.wait()
+
+    async def join(self):
+        """
+        Waits until all handlers, including the ones started meanwhile, finish.
+        """
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    async def _call(self, function, *args, **kwargs):
+        self.running += 1
+        self._notify_space()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            self.running -= 1
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        self._notify_space()
+
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('Exception in handler', exc_info=task.exception())
+
+    def _notify_space(self):
+        if self._space is not None and self.queue_depth < self.max_queue:
+            self._space.set()
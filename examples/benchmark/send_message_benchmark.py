@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import asyncio
+
+import aiotgram
+
+from aiotgram.fake_server import FakeBotApiServer
+
+
+MESSAGES = 10000
+CONCURRENCY = 100
+
+
+async def main(messages=MESSAGES, concurrency=CONCURRENCY):
+    async with FakeBotApiServer(latency=(0.005, 0.02), rate_limit_rate=0.01, retry_after=0.1) as server:
+        bot = aiotgram.AioTGram('123:TOKEN')
+
+        started = time.monotonic()
+        results = [result async for result in bot.broadcast(range(1, messages + 1), 'Hello', concurrency=concurrency)]
+        elapsed = time.monotonic() - started
+
+        await bot.close()
+
+    failed = sum(not result.ok for result in results)
+    print('{0} messages in {1:.2f}s, {2:.0f} msg/s, {3} failed, {4} requests'.format(
+        messages, elapsed, messages / elapsed, failed, sum(server.requests.values())))
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*map(int, sys.argv[1:])))
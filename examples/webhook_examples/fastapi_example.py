@@ -19,10 +19,10 @@ async def startup_actions():
 
 
 async def handler(request: Request):
-    request_body_dict = await request.json()
-    update = aiotgram.types.Update.de_json(request_body_dict)
+    # The first reply of the handlers is sent in the response instead of a separate request.
+    reply = await bot.process_webhook_update(await request.body(), reply_timeout=1)
 
-    return JSONResponse({"status": "success"}, status_code=200)
+    return JSONResponse(reply or {"status": "success"}, status_code=200)
 
 
 def get_routes():
@@ -32,11 +32,11 @@ def get_routes():
     return routes
 
 
-app = FastAPI(routes=get_routes())
+app = FastAPI(routes=get_routes(), on_shutdown=[bot.close])
 
 asyncio.get_running_loop().create_task(startup_actions())
 
 
 @bot.message_handler(commands=['start'])
 async def start(message):
-    pass
+    await bot.send_message(message.chat.id, 'Hello!')
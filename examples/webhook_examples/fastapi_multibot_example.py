@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import aiotgram
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.routing import Route
+
+
+TOKENS = ['<bot_token_1>', '<bot_token_2>']
+
+pool = aiotgram.BotPool(aiotgram.RequestSession(rate_limiter=aiotgram.RateLimiter()))
+
+
+def setup_handlers(bot):
+    @bot.message_handler(commands=['start'])
+    async def start(message):
+        await bot.send_message(message.chat.id, 'Hello!')
+
+
+for token in TOKENS:
+    setup_handlers(pool.add_bot(token))
+
+
+async def startup_actions():
+    await pool.set_webhooks('<url>/webhook/')
+
+
+async def handler(request: Request):
+    try:
+        reply = await pool.process_webhook_update(request.path_params['path'], await request.body(), reply_timeout=1)
+    except KeyError:
+        return JSONResponse({"status": "not found"}, status_code=404)
+
+    return JSONResponse(reply or {"status": "success"}, status_code=200)
+
+
+def get_routes():
+    routes = [
+        Route('/webhook/{path}', handler, methods=["POST"])
+    ]
+    return routes
+
+
+app = FastAPI(routes=get_routes(), on_startup=[startup_actions], on_shutdown=[pool.close])
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+import random
+import re
+
+import pytest
+
+from aiotgram import AioTGram, util
+from aiotgram.dispatch import HandlerList, RegexpSet, UpdateDeduplicator
+
+
+class FakeMessage:
+    def __init__(self, content_type, text=None):
+        self.content_type = content_type
+        self.text = text
+
+
+def linear_test_filter(message_filter, filter_value, message):
+    if message_filter == 'content_types':
+        return message.content_type in filter_value
+    if message_filter == 'regexp':
+        return message.content_type == 'text' and re.search(filter_value, message.text, re.IGNORECASE)
+    if message_filter == 'commands':
+        return message.content_type == 'text' and util.extract_command(message.text) in filter_value
+    if message_filter == 'func':
+        return filter_value(message)
+
+    return False
+
+
+def linear_find_position(handlers, message, start=0):
+    """
+    Testing of all handlers one by one as it was done before HandlerIndex.
+    """
+    for position in range(start, len(handlers)):
+        filters = handlers[position]['filters']
+        if all(value is None or linear_test_filter(name, value, message) for name, value in filters.items()):
+            return position
+
+    return None
+
+
+PATTERNS = ['foo', 'bar', 'baz', '^hi', 'end$', 'a.c', '(x|y)z', '[0-9]+', 'FOO', r'(\w)\1', '(?P<name>qux)',
+            '(?x) a b c', '(?s)a.c']
+COMMANDS = ['start', 'help', 'stop']
+TEXTS = ['/start x', '/help@bot', 'hello foo', 'HI there', 'abc end', 'xz 12', 'nothing', '/stop', 'Foo', 'aa qux',
+         'abc', 'a\nc']
+
+
+def make_handler(rnd):
+    filters = {}
+    if rnd.random() < 0.3:
+        filters['commands'] = rnd.sample(COMMANDS, rnd.randint(1, 2))
+    if rnd.random() < 0.5:
+        filters['regexp'] = rnd.choice(PATTERNS)
+    if rnd.random() < 0.3:
+        remainder = rnd.randint(0, 3)
+        filters['func'] = lambda message: len(message.text or '') % 4 != remainder
+    if rnd.random() < 0.05:
+        filters['unknown'] = True
+    filters['content_types'] = rnd.choice([['text'], ['photo'], ['text', 'photo'], None])
+
+    return AioTGram._build_handler_dict(None, **filters)
+
+
+def make_message(rnd):
+    content_type = rnd.choice(['text', 'text', 'photo'])
+    text = rnd.choice(TEXTS) if content_type == 'text' else None
+
+    return FakeMessage(content_type, text)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_find_position_matches_linear_scan(seed):
+    rnd = random.Random(seed)
+
+    for _ in range(1000):
+        handlers = HandlerList()
+        for _ in range(rnd.randint(1, 12)):
+            handler = make_handler(rnd)
+            if rnd.random() < 0.5:
+                handlers.append(handler)
+            else:
+                handlers.insert(len(handlers), handler)
+
+        for _ in range(10):
+            message = make_message(rnd)
+            start = rnd.randint(0, len(handlers))
+
+            assert handlers.find_position(message) == linear_find_position(handlers, message)
+            assert handlers.find_position(message, start) == linear_find_position(handlers, message, start)
+
+
+def test_find_returns_first_registered_handler():
+    handlers = HandlerList()
+    handlers.append(AioTGram._build_handler_dict('regexp', regexp='hello'))
+    handlers.append(AioTGram._build_handler_dict('command', commands=['start']))
+    handlers.append(AioTGram._build_handler_dict('text', content_types=['text']))
+
+    assert handlers.find(FakeMessage('text', '/start hello'))['function'] == 'regexp'
+    assert handlers.find(FakeMessage('text', '/start'))['function'] == 'command'
+    assert handlers.find(FakeMessage('text', 'bye'))['function'] == 'text'
+    assert handlers.find(FakeMessage('photo')) is None
+
+
+def test_changes_of_list_rebuild_index():
+    handlers = HandlerList()
+    handlers.append(AioTGram._build_handler_dict('first', content_types=['text']))
+    message = FakeMessage('text', 'hi')
+    assert handlers.find(message)['function'] == 'first'
+
+    handlers.insert(0, AioTGram._build_handler_dict('inserted', regexp='hi'))
+    assert handlers.find(message)['function'] == 'inserted'
+
+    handlers.pop(0)
+    del handlers[0]
+    assert handlers.find(message) is None
+
+
+def test_invalid_regexp_fails_at_registration():
+    handlers = HandlerList()
+    handlers.append(AioTGram._build_handler_dict('valid', regexp='ok'))
+
+    with pytest.raises(re.error):
+        handlers.append(AioTGram._build_handler_dict('invalid', regexp='('))
+
+    assert len(handlers) == 1
+    assert handlers.find(FakeMessage('text', 'ok'))['function'] == 'valid'
+
+
+def test_regexp_set_resumes_from_start():
+    regexps = RegexpSet()
+    for position, pattern in enumerate(['foo', 'bar', 'foo']):
+        assert regexps.add(position, pattern)
+
+    assert regexps.search('FOO bar') == 0
+    assert regexps.search('foo bar', 1) == 1
+    assert regexps.search('foo', 1) == 2
+    assert regexps.search('foo', 3) is None
+    assert regexps.search('nothing') is None
+
+
+@pytest.mark.parametrize('pattern', [r'(a)\1', '(?P<name>a)', '(?P<name>a)(?P=name)', '(a)?(?(1)b|c)',
+                                     '(?x) a b', '(?s)a.b', '(?i)ab', '('])
+def test_regexp_set_does_not_merge_unsafe_patterns(pattern):
+    assert not RegexpSet().add(0, pattern)
+
+
+def test_regexp_set_merges_scoped_flags():
+    regexps = RegexpSet()
+    assert regexps.add(0, '(?x: a b )c')
+    assert regexps.add(1, 'hello world')
+
+    assert regexps.search('say hello world') == 1
+    assert regexps.search('abc') == 0
+
+
+def test_deduplicator_drops_repeated_ids():
+    deduplicator = UpdateDeduplicator(window=16)
+
+    assert deduplicator.check(100)
+    assert deduplicator.check(102)
+    assert not deduplicator.check(100)
+    assert deduplicator.check(101)
+    assert not deduplicator.check(102)
+    assert deduplicator.dropped == 2
+
+
+def test_deduplicator_starts_new_sequence_below_window():
+    deduplicator = UpdateDeduplicator(window=16)
+
+    assert deduplicator.check(1000)
+    assert deduplicator.check(5)
+    assert not deduplicator.check(5)
+    assert deduplicator.check(1000)
+
+
+@pytest.mark.parametrize('window', [8, 13, 64])
+def test_deduplicator_matches_set_of_ids(window):
+    rnd = random.Random(window)
+    deduplicator = UpdateDeduplicator(window=window)
+    seen = set()
+    last_update_id = None
+
+    for _ in range(20000):
+        if last_update_id is None or rnd.random() < 0.01:
+            update_id = rnd.randint(0, 10 ** 6)
+        else:
+            update_id = last_update_id + rnd.randint(-window - 2, window * 2)
+
+        if last_update_id is None or update_id <= last_update_id - window:
+            seen = set()
+            last_update_id = update_id
+        elif update_id > last_update_id:
+            seen = {seen_id for seen_id in seen if seen_id > update_id - window}
+            last_update_id = update_id
+
+        expected = update_id not in seen
+        seen.add(update_id)
+
+        assert deduplicator.check(update_id) == expected